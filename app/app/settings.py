@@ -54,15 +54,19 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middlewares.ServerTimingMiddleware",
+    # Outside of the page cache, so 304 responses are never cached
+    "django.middleware.http.ConditionalGetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.cache.UpdateCacheMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middlewares.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "core.middlewares.ExpiringLinkMiddleware",
-    "django.middleware.cache.FetchFromCacheMiddleware",
+    "core.middlewares.FetchFromCacheMiddleware",
 ]
 
 ROOT_URLCONF = "app.urls"
@@ -84,6 +88,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "app.wsgi.application"
+ASGI_APPLICATION = "app.asgi.application"
+
+# "uwsgi" or "asgi", the latter routes the API hot paths to async views
+SERVER_MODE = os.environ.get("SERVER_MODE", "uwsgi")
 
 
 # Database
@@ -96,9 +104,39 @@ DATABASES = {
         "NAME": os.environ.get("DB_NAME"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
+        "PORT": os.environ.get("DB_PORT", ""),
+        # Seconds to keep a connection open between requests, 0 closes it
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("DB_CONN_HEALTH_CHECKS", 1))),
+        # pgbouncer in transaction mode cannot keep cursors between transactions
+        "DISABLE_SERVER_SIDE_CURSORS": bool(int(os.environ.get("DB_PGBOUNCER", 0))),
     }
 }
 
+# Pool of idle connections shared by the threads of a worker process,
+# connections go back to the pool at the end of every request
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 0))
+if DB_POOL_SIZE:
+    DATABASES["default"].update(
+        ENGINE="core.db.postgresql_pool",
+        POOL_SIZE=DB_POOL_SIZE,
+        CONN_MAX_AGE=0,
+    )
+
+# Read replicas with the credentials of the primary, e.g. "replica1,replica2".
+# Pointing it at the primary host tries the routing out locally.
+DB_REPLICA_HOSTS = [h for h in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if h]
+for number, host in enumerate(DB_REPLICA_HOSTS, 1):
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["core.db.routers.ReplicaRouter"]
+# Seconds a user reads from the primary after a write, to cover replica lag
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -140,6 +178,8 @@ MEDIA_URL = "/static/media/"
 STATIC_ROOT = "/vol/web/static"
 MEDIA_ROOT = "/vol/web/media"
 
+DEFAULT_FILE_STORAGE = "core.storage.TimedFileSystemStorage"
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -156,6 +196,11 @@ AUTH_USER_MODEL = "core.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "core.renderers.MessagePackRenderer",
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -171,9 +216,79 @@ CACHES = {
         "LOCATION": "/var/tmp/django_cache",
         "TIMEOUT": 30,
         "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+    # Counters shared by all workers, they need atomic increments
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL"),
     }
+    if os.environ.get("REDIS_URL")
+    else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
 }
 
 CACHE_MIDDLEWARE_ALIAS = "default"
 CACHE_MIDDLEWARE_SECONDS = 15
 CACHE_MIDDLEWARE_KEY_PREFIX = ""
+
+
+# Upload limits, used when the user's tier does not define its own
+
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 40_000_000))
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+
+
+# Rate limits per endpoint, tiers can override them with their rate_limits
+
+RATE_LIMITS = {
+    "upload": os.environ.get("RATE_LIMIT_UPLOAD", "30/minute"),
+    "link": os.environ.get("RATE_LIMIT_LINK", "120/minute"),
+    "link_batch": os.environ.get("RATE_LIMIT_LINK_BATCH", "10/minute"),
+}
+
+# Most images a single batch of expiring links may ask for
+LINK_BATCH_MAX_IMAGES = int(os.environ.get("LINK_BATCH_MAX_IMAGES", 500))
+
+# Revoked links the filter of revocations is sized for, it grows beyond that
+# at the given rate of false positives, which cost a query each
+LINK_REVOCATION_CAPACITY = int(os.environ.get("LINK_REVOCATION_CAPACITY", 10000))
+LINK_REVOCATION_ERROR_RATE = float(
+    os.environ.get("LINK_REVOCATION_ERROR_RATE", 0.01)
+)
+
+# Hits of expiring links are added up by every worker and written by a thread
+# of it this often or once this many links were hit, a crash loses what is
+# pending
+ACCESS_FLUSH_SECONDS = float(os.environ.get("ACCESS_FLUSH_SECONDS", 10))
+ACCESS_FLUSH_MAX_KEYS = int(os.environ.get("ACCESS_FLUSH_MAX_KEYS", 1000))
+
+# Users whose near-duplicate search index every worker keeps in memory
+SIMILARITY_INDEX_USERS = int(os.environ.get("SIMILARITY_INDEX_USERS", 100))
+
+
+# Profiling of requests, stored profiles are listed in the admin
+
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+# Staff users can profile single requests by sending this header
+PROFILING_HEADER = "HTTP_X_PROFILE"
+
+
+# Time spent per request stage (auth, permissions, database, serialization,
+# storage, thumbnails) in Server-Timing headers and JSON logs
+
+SERVER_TIMING = bool(int(os.environ.get("SERVER_TIMING", 0)))
+TIMING_LOG = bool(int(os.environ.get("TIMING_LOG", 0)))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"message": {"format": "%(message)s"}},
+    "handlers": {
+        "timing": {"class": "logging.StreamHandler", "formatter": "message"},
+    },
+    "loggers": {
+        "core.timing": {"handlers": ["timing"], "level": "INFO", "propagate": False},
+    },
+}
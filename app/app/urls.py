@@ -14,19 +14,28 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.views import lazy_view, metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
+    # Exposed to private networks only by the proxy
+    path("metrics", metrics, name="metrics"),
+    # drf_spectacular loads the OpenAPI generator and YAML, only on demand
+    path(
+        "api/schema/",
+        lazy_view("drf_spectacular.views.SpectacularAPIView"),
+        name="api-schema",
+    ),
     path(
         "api/docs/",
-        SpectacularSwaggerView.as_view(url_name="api-schema"),
+        lazy_view(
+            "drf_spectacular.views.SpectacularSwaggerView", url_name="api-schema"
+        ),
         name="api-docs",
     ),
     path("api/user/", include("user.urls")),
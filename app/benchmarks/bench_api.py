@@ -0,0 +1,54 @@
+"""
+Latency benchmarks of the image API endpoints.
+
+Run from the app directory with: pytest benchmarks
+Results are saved as JSON per commit with --benchmark-autosave and compared
+with an earlier run with --benchmark-compare.
+"""
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from benchmarks.seed import image_bytes
+from core.models import Image
+
+
+def test_upload(api_client, measure):
+    content = image_bytes()
+
+    def upload():
+        image = SimpleUploadedFile("bench.jpg", content, "image/jpeg")
+        return api_client.post(
+            "/api/user/images/", {"image": image}, format="multipart"
+        )
+
+    response = measure(upload)
+
+    assert response.status_code == 201
+
+
+def test_list(api_client, measure):
+    response = measure(api_client.get, "/api/user/images/")
+
+    assert response.status_code == 200
+
+
+def test_retrieve(api_client, user, measure):
+    image = Image.objects.filter(user=user).first()
+
+    response = measure(api_client.get, f"/api/user/images/{image.id}/")
+
+    assert response.status_code == 200
+
+
+def test_thumbnail_list(api_client, measure):
+    response = measure(api_client.get, "/api/user/thumbnails/")
+
+    assert response.status_code == 200
+
+
+def test_link(api_client, user, measure):
+    image = Image.objects.filter(user=user).first()
+
+    response = measure(api_client.get, f"/api/user/link/{image.id}/?time=500")
+
+    assert response.status_code == 200
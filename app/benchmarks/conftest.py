@@ -0,0 +1,62 @@
+"""
+Fixtures of the pytest-benchmark suite.
+"""
+
+import os
+
+import pytest
+
+from django.core.cache import caches
+from django.test.utils import override_settings
+
+from rest_framework.test import APIClient
+
+from benchmarks.seed import seed_users
+from benchmarks.stats import summarize
+
+
+@pytest.fixture(scope="session")
+def seeded_users(django_db_setup, django_db_blocker, tmp_path_factory):
+    """Users of every base tier with BENCHMARK_IMAGES images each."""
+
+    overrides = {
+        "MEDIA_ROOT": str(tmp_path_factory.mktemp("media")),
+        "RATE_LIMITS": {},
+        # Cached responses would skip the views being measured
+        "CACHE_MIDDLEWARE_SECONDS": 0,
+    }
+    with override_settings(**overrides), django_db_blocker.unblock():
+        yield seed_users(int(os.environ.get("BENCHMARK_IMAGES", 20)))
+
+
+@pytest.fixture
+def user(seeded_users, db):
+    """The Enterprise user, allowed to use every endpoint."""
+
+    caches["shared"].clear()
+    return seeded_users["Enterprise"][0]
+
+
+@pytest.fixture
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def measure(benchmark):
+    """Benchmark a function and add its p50/p95/p99 to the results."""
+
+    def run(function, *args, **kwargs):
+        result = benchmark(function, *args, **kwargs)
+        # There are no stats with --benchmark-disable
+        if not benchmark.stats:
+            return result
+        summary = summarize(t * 1000 for t in benchmark.stats.stats.data)
+        benchmark.extra_info.update(
+            {key: value for key, value in summary.items() if key.startswith("p")}
+        )
+        return result
+
+    return run
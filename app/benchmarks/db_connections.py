@@ -0,0 +1,81 @@
+"""
+Benchmark of the database connection setup time per request.
+
+Run from the app directory with: python -m benchmarks.db_connections
+Requests are simulated the way Django handles them: old connections are
+closed when a request starts and finishes, and the first query of the
+request connects again if needed. "thread per request" modes drop the
+wrapper after every request like sync views served in ASGI mode do.
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+MODES = [
+    # name, engine, CONN_MAX_AGE, CONN_HEALTH_CHECKS, thread per request
+    ("no reuse", "django.db.backends.postgresql", 0, False, False),
+    ("persistent", "django.db.backends.postgresql", 60, False, False),
+    ("persistent, health checks", "django.db.backends.postgresql", 60, True, False),
+    ("persistent, thread per request", "django.db.backends.postgresql", 60, True, True),
+    ("pool, thread per request", "core.db.postgresql_pool", 0, True, True),
+]
+
+
+def run_mode(settings_dict, engine, max_age, health_checks, fresh, requests):
+    """Return setup times in milliseconds of the requests of one mode."""
+
+    from django.db.utils import load_backend
+
+    settings_dict = {
+        **settings_dict,
+        "ENGINE": engine,
+        "CONN_MAX_AGE": max_age,
+        "CONN_HEALTH_CHECKS": health_checks,
+    }
+    backend = load_backend(engine)
+    wrapper = backend.DatabaseWrapper(settings_dict, "benchmark")
+
+    timings = []
+    for _ in range(requests):
+        if fresh:
+            wrapper.close()
+            wrapper = backend.DatabaseWrapper(settings_dict, "benchmark")
+        wrapper.close_if_unusable_or_obsolete()
+        start = time.perf_counter()
+        wrapper.close_if_health_check_failed()
+        wrapper.ensure_connection()
+        timings.append((time.perf_counter() - start) * 1000)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        wrapper.close_if_unusable_or_obsolete()
+    wrapper.close()
+
+    return sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from django.db import connection
+
+    print(f"requests: {args.requests}, setup time per request in ms")
+    for name, *mode in MODES:
+        timings = run_mode(connection.settings_dict, *mode, args.requests)
+        print(
+            f"{name:32} mean: {statistics.fmean(timings):.3f}, "
+            f"p50: {timings[len(timings) // 2]:.3f}, "
+            f"p99: {timings[int(len(timings) * 0.99)]:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+HTTP load generator for comparing deployment modes of the image API.
+
+Run against a live server, e.g. uWSGI and then ASGI mode:
+    python -m benchmarks.http_load http://127.0.0.1:8000 --token <key> --image-id 1
+
+Only the standard library is used, so it runs anywhere the app runs.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import PIL.Image
+
+from benchmarks.stats import summarize
+
+
+def upload_body():
+    """Return the content type and body of a multipart image upload."""
+
+    buffer = io.BytesIO()
+    PIL.Image.new("RGB", (640, 480), color=(90, 120, 200)).save(buffer, "JPEG")
+    boundary = uuid.uuid4().hex
+    body = (
+        (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="image"; filename="load.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode()
+        + buffer.getvalue()
+        + f"\r\n--{boundary}--\r\n".encode()
+    )
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+class Worker(threading.Thread):
+    """Send requests of a scenario over one keep-alive connection."""
+
+    def __init__(self, target, token, scenario, deadline):
+        super().__init__(daemon=True)
+        self.target = target
+        self.headers = {"Authorization": f"Token {token}"}
+        self.scenario = scenario
+        self.deadline = deadline
+        self.timings = {name: [] for name, *_ in scenario}
+        self.errors = 0
+
+    def connect(self):
+        return http.client.HTTPConnection(self.target.hostname, self.target.port)
+
+    def send(self, connection, method, path, body, headers):
+        """Send a request, reconnecting once if the server closed the connection."""
+
+        for retry in (False, True):
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                return response
+            except (http.client.RemoteDisconnected, BrokenPipeError):
+                if retry:
+                    raise
+                connection.close()
+
+    def run(self):
+        connection = self.connect()
+        step = 0
+        while time.monotonic() < self.deadline:
+            name, method, path, content_type, body = self.scenario[step]
+            step = (step + 1) % len(self.scenario)
+            headers = dict(self.headers)
+            if content_type:
+                headers["Content-Type"] = content_type
+            start = time.perf_counter()
+            try:
+                response = self.send(connection, method, path, body, headers)
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                connection = self.connect()
+                continue
+            if response.status >= 400:
+                self.errors += 1
+            self.timings[name].append((time.perf_counter() - start) * 1000)
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("url", help="Base URL of the running server.")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--image-id", type=int, required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--upload", action="store_true", help="Include uploads.")
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    scenario = [
+        ("list", "GET", "/api/user/images/", None, None),
+        ("retrieve", "GET", f"/api/user/images/{args.image_id}/", None, None),
+        ("link", "GET", f"/api/user/link/{args.image_id}/?time=500", None, None),
+    ]
+    if args.upload:
+        scenario.append(("upload", "POST", "/api/user/images/", *upload_body()))
+
+    deadline = time.monotonic() + args.duration
+    workers = [
+        Worker(target, args.token, scenario, deadline)
+        for _ in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    results = {}
+    for name, *_ in scenario:
+        results[name] = summarize(
+            t for worker in workers for t in worker.timings[name]
+        )
+        results[name]["rps"] = round(results[name]["requests"] / args.duration, 1)
+    results["errors"] = sum(worker.errors for worker in workers)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark of listing images of a user with many images.
+
+Run from the app directory with: python -m benchmarks.image_list
+A user gets --rows images inserted into a temporary database. The list is
+then fetched and serialized the ways ImageViewSet.list has done it: model
+instances through a plain DRF model serializer, model instances through
+ImageSerializer, and values_list() rows through ImageListSerializer. Each
+is timed with and without access to the original, where the URL of the
+original is replaced by its file name.
+"""
+
+import argparse
+import json
+import os
+
+import django
+
+from benchmarks.serializers import measure, plain_serializer
+
+
+def instances_list(serializer_class):
+    """Return a function listing images as ImageViewSet.list used to."""
+
+    from image.views import hide_original_path
+
+    def list_images(request, queryset, show_original):
+        data = serializer_class(
+            queryset.all(), many=True, context={"request": request}
+        ).data
+        if not show_original:
+            for item in data:
+                hide_original_path(item)
+        return data
+
+    return list_images
+
+
+def rows_list(request, queryset, show_original):
+    """List images as ImageViewSet.list does."""
+
+    from image.serializers import ImageListSerializer
+
+    serializer = ImageListSerializer(request, show_original=show_original)
+    return serializer.to_representation(list(serializer.rows(queryset)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from rest_framework.request import Request
+
+    from core.models import Image, Tier
+    from image.serializers import ImageSerializer
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.settings_dict["TEST"]["NAME"] = f"benchmark_{old_name}"
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        tier = Tier.objects.create(name="Bench list", original_size=True)
+        user = get_user_model().objects.create_user(
+            username="bench-list", password="bench1234", tier=tier
+        )
+        Image.objects.bulk_create(
+            Image(
+                user=user,
+                image=f"uploads/images/{user.id}/{i:08x}_full_size.jpg",
+                width=640,
+                height=480,
+                file_size=123456,
+                format="JPEG",
+                content_hash=f"{i:064x}",
+                exif={"make": "Camera", "orientation": 1},
+            )
+            for i in range(args.rows)
+        )
+        request = Request(RequestFactory().get("/"))
+        queryset = Image.objects.filter(user=user)
+        paths = {
+            "model serializer": instances_list(plain_serializer(ImageSerializer)),
+            "fast serializer": instances_list(ImageSerializer),
+            "values rows": rows_list,
+        }
+
+        results = {}
+        for show_original in (True, False):
+            access = "original" if show_original else "masked"
+            for name, list_images in paths.items():
+                total_ms = measure(
+                    lambda: list_images(request, queryset, show_original),
+                    args.repeat,
+                )
+                row = {
+                    "total_ms": round(total_ms, 1),
+                    "row_us": round(total_ms * 1000 / args.rows, 2),
+                }
+                results[f"{access}, {name}"] = row
+                print(
+                    f"{access:8} {name:16} {row['total_ms']:8} ms, "
+                    f"{row['row_us']:6} us/row"
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
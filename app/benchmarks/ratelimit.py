@@ -0,0 +1,59 @@
+"""
+Microbenchmark of the rate limiter cost per request.
+
+Run from the app directory with: python -m benchmarks.ratelimit
+The configured "shared" cache is used, set REDIS_URL to measure Redis.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+import django
+
+BUDGET_US = 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from image.throttling import TierRateThrottle
+
+    tier = SimpleNamespace(rate_limits={"upload": "1000000/minute"})
+    users = [
+        SimpleNamespace(pk=pk, tier=tier, is_staff=False, is_superuser=False)
+        for pk in range(args.users)
+    ]
+    view = SimpleNamespace(action="create", throttle_scopes={"create": "upload"})
+    requests = [
+        SimpleNamespace(user=users[i % args.users]) for i in range(args.requests)
+    ]
+
+    timings = []
+    for request in requests:
+        start = time.perf_counter_ns()
+        TierRateThrottle().allow_request(request, view)
+        timings.append((time.perf_counter_ns() - start) / 1000)
+
+    timings.sort()
+    mean = statistics.fmean(timings)
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"requests: {args.requests}, users: {args.users}")
+    p50 = timings[len(timings) // 2]
+    print(f"mean: {mean:.1f} us, p50: {p50:.1f} us, p99: {p99:.1f} us")
+    print(f"budget: {BUDGET_US} us per request")
+
+    return 0 if mean < BUDGET_US else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Offline scenario runner for the image API.
+
+Run from the app directory with: python -m benchmarks.scenarios
+A throwaway test database is created and seeded with users of every base
+tier owning --images images. Each user then sends a weighted mix of
+requests through the Django test client, like locust users do over HTTP,
+so no server or network is needed. Latency percentiles per endpoint and
+tier are printed and written with --output; pass an earlier result with
+--compare to see the change between commits.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import django
+
+from benchmarks.stats import summarize
+
+# Endpoint name and weight in the request mix
+TASKS = [
+    ("upload", 1),
+    ("list", 5),
+    ("retrieve", 5),
+    ("thumbnail_list", 3),
+    ("link", 2),
+]
+
+
+class VirtualUser:
+    """A seeded user sending requests of the scenario."""
+
+    def __init__(self, user, upload_content):
+        from rest_framework.test import APIClient
+
+        from core.models import Image
+
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.image_ids = list(
+            Image.objects.filter(user=user).values_list("id", flat=True)
+        )
+        self.upload_content = upload_content
+        self.tasks = [
+            (name, weight)
+            for name, weight in TASKS
+            if name != "link" or user.tier.expiring_link
+        ]
+
+    def upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        image = SimpleUploadedFile("bench.jpg", self.upload_content, "image/jpeg")
+        response = self.client.post(
+            "/api/user/images/", {"image": image}, format="multipart"
+        )
+        if response.status_code == 201:
+            self.image_ids.append(response.data["id"])
+        return response
+
+    def list(self):
+        return self.client.get("/api/user/images/")
+
+    def retrieve(self):
+        return self.client.get(f"/api/user/images/{random.choice(self.image_ids)}/")
+
+    def thumbnail_list(self):
+        return self.client.get("/api/user/thumbnails/")
+
+    def link(self):
+        image_id = random.choice(self.image_ids)
+        return self.client.get(f"/api/user/link/{image_id}/?time=500")
+
+    def run_task(self):
+        """Send a request of a task picked by weight.
+
+        Returns the task name, the response time in ms and whether it succeeded.
+        """
+
+        names, weights = zip(*self.tasks)
+        name = random.choices(names, weights)[0]
+        start = time.perf_counter()
+        response = getattr(self, name)()
+        elapsed = (time.perf_counter() - start) * 1000
+        return name, elapsed, response.status_code < 400
+
+
+def current_commit():
+    """Return the checked out commit or None outside of a git checkout."""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(args):
+    """Seed the database, run the request mix and return the results."""
+
+    from benchmarks.seed import image_bytes, seed_users
+
+    random.seed(args.seed)
+    users = seed_users(args.images, args.users)
+    content = image_bytes()
+    virtual_users = [
+        (tier, VirtualUser(user, content))
+        for tier, tier_users in users.items()
+        for user in tier_users
+    ]
+
+    timings = {}
+    errors = 0
+    for _ in range(args.requests):
+        for tier, virtual_user in virtual_users:
+            name, elapsed, ok = virtual_user.run_task()
+            timings.setdefault(name, {}).setdefault(tier, []).append(elapsed)
+            errors += not ok
+
+    return {
+        "commit": current_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "images": args.images,
+            "users": args.users,
+            "requests": args.requests,
+            "seed": args.seed,
+        },
+        "endpoints": {
+            name: summarize(t for tier in timings[name].values() for t in tier)
+            for name, _ in TASKS
+            if name in timings
+        },
+        "tiers": {
+            name: {tier: summarize(t) for tier, t in timings[name].items()}
+            for name, _ in TASKS
+            if name in timings
+        },
+        "errors": errors,
+    }
+
+
+def print_results(results, baseline=None):
+    """Print endpoint percentiles, with the change from a baseline if given."""
+
+    print(f"commit: {results['commit']}, errors: {results['errors']}")
+    for name, summary in results["endpoints"].items():
+        line = f"{name:15} n={summary['requests']:5}"
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            line += f"  {key[:3]}: {summary[key]:8.2f}"
+            old = (baseline or {}).get("endpoints", {}).get(name, {}).get(key)
+            if old:
+                line += f" ({(summary[key] - old) / old:+.0%})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=20, help="Images per user.")
+    parser.add_argument("--users", type=int, default=1, help="Users per tier.")
+    parser.add_argument("--requests", type=int, default=200, help="Per user.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--page-cache", action="store_true", help="Keep caching.")
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    parser.add_argument("--compare", help="Results JSON of an earlier run.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import (
+        override_settings,
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    media_root = tempfile.mkdtemp(prefix="benchmark-media-")
+    overrides = {"MEDIA_ROOT": media_root, "RATE_LIMITS": {}}
+    if not args.page_cache:
+        # Cached responses would skip the views being measured
+        overrides["CACHE_MIDDLEWARE_SECONDS"] = 0
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.settings_dict["TEST"]["NAME"] = f"benchmark_{old_name}"
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(**overrides):
+            results = run_scenario(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
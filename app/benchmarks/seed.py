@@ -0,0 +1,46 @@
+"""
+Benchmark data: users of every base tier with uploaded images.
+"""
+
+import io
+
+import PIL.Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+
+from core.models import Image, Tier
+
+
+def image_bytes(size=(640, 480), image_format="JPEG"):
+    """Return an encoded image with enough detail to compress realistically."""
+
+    image = PIL.Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 64)
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def seed_users(images_per_user, users_per_tier=1):
+    """Create users in the base tiers, each with `images_per_user` images.
+
+    Returns the users by tier name. Images go through the upload signal, so
+    thumbnails and metadata are created like for real uploads.
+    """
+
+    call_command("model_base_setup", stdout=io.StringIO())
+    content = image_bytes()
+    users = {}
+    for tier in Tier.objects.order_by("id"):
+        for number in range(users_per_tier):
+            user = get_user_model().objects.create_user(
+                username=f"bench-{tier.name.lower()}-{number}",
+                password="bench1234",
+                tier=tier,
+            )
+            for _ in range(images_per_user):
+                Image(user=user).image.save("bench.jpg", ContentFile(content))
+            users.setdefault(tier.name, []).append(user)
+
+    return users
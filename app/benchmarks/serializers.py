@@ -0,0 +1,160 @@
+"""
+Microbenchmark of the image and thumbnail serializers.
+
+Run from the app directory with: python -m benchmarks.serializers
+Lists of unsaved images and thumbnails are serialized by plain DRF model
+serializers, as the API did before, and by the API serializers with their
+cached fields and representation plan, with all fields and with a sparse
+fieldset. The time per row, the time to build the fields of a serializer
+and the size and render time of a list as JSON and MessagePack are
+reported. No database is needed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import django
+
+SPARSE_FIELDS = {"image": "id,image", "thumbnail": "id,height,thumbnail"}
+
+
+def measure(function, repeat):
+    """Return the median milliseconds taken by a call of a function."""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def plain_serializer(serializer_class):
+    """Return a ModelSerializer with the fields of an API serializer."""
+
+    from rest_framework import serializers
+
+    return type(
+        f"Plain{serializer_class.__name__}",
+        (serializers.ModelSerializer,),
+        {
+            **serializer_class._declared_fields,
+            # Methods of the SerializerMethodFields
+            **{
+                name: getattr(serializer_class, name)
+                for name in dir(serializer_class)
+                if name.startswith("get_")
+                and not hasattr(serializers.ModelSerializer, name)
+            },
+            "Meta": type("Meta", (serializer_class.Meta,), {}),
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from django.test import RequestFactory
+    from django.test.utils import setup_test_environment
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+
+    from core.models import Image, Thumbnail, ThumbnailSize
+    from core.renderers import MessagePackRenderer
+    from image.serializers import ImageSerializer, ThumbnailSerializer
+
+    # Allows the host of the requests built by the RequestFactory
+    setup_test_environment()
+
+    images = [
+        Image(
+            id=i,
+            user_id=1,
+            image=f"uploads/images/1/{i:08x}.jpg",
+            width=640,
+            height=480,
+            file_size=123456,
+            format="JPEG",
+            content_hash="0" * 64,
+            exif={"make": "Camera", "orientation": 1},
+        )
+        for i in range(args.rows)
+    ]
+    size = ThumbnailSize(id=1, height=200)
+    thumbnails = [
+        Thumbnail(
+            id=i,
+            user_id=1,
+            image=image,
+            height=size,
+            thumbnail=f"uploads/images/1/{i:08x}-200.jpg",
+            width=267,
+            file_size=12345,
+            format="JPEG",
+            content_hash="0" * 64,
+        )
+        for i, image in enumerate(images)
+    ]
+    sources = {
+        "image": (ImageSerializer, images),
+        "thumbnail": (ThumbnailSerializer, thumbnails),
+    }
+
+    def context(fields=None):
+        query = {"fields": fields} if fields else {}
+        return {"request": Request(RequestFactory().get("/", query))}
+
+    results = {}
+    for name, (serializer_class, rows) in sources.items():
+        plain_class = plain_serializer(serializer_class)
+        variants = {
+            "plain": (plain_class, context()),
+            "fast": (serializer_class, context()),
+            "fast sparse": (serializer_class, context(SPARSE_FIELDS[name])),
+        }
+        for variant, (cls, cls_context) in variants.items():
+            data = cls(rows, many=True, context=cls_context).data
+            list_ms = measure(
+                lambda: cls(rows, many=True, context=cls_context).data, args.repeat
+            )
+            fields_ms = measure(
+                lambda: cls(context=cls_context).fields, args.repeat * 10
+            )
+            json_ms = measure(lambda: JSONRenderer().render(data), args.repeat)
+            msgpack_ms = measure(
+                lambda: MessagePackRenderer().render(data), args.repeat
+            )
+            row = {
+                "row_us": round(list_ms * 1000 / len(rows), 2),
+                "fields_ms": round(fields_ms, 3),
+                "json_bytes": len(JSONRenderer().render(data)),
+                "msgpack_bytes": len(MessagePackRenderer().render(data)),
+                "json_render_ms": round(json_ms, 2),
+                "msgpack_render_ms": round(msgpack_ms, 2),
+            }
+            results[f"{name}, {variant}"] = row
+            print(
+                f"{name:9} {variant:11} {row['row_us']:7} us/row, "
+                f"fields {row['fields_ms']:6} ms, "
+                f"JSON {row['json_bytes']:8} B {row['json_render_ms']:6} ms, "
+                f"MessagePack {row['msgpack_bytes']:8} B "
+                f"{row['msgpack_render_ms']:6} ms"
+            )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
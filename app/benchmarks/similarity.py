@@ -0,0 +1,74 @@
+"""
+Benchmark of the near-duplicate search of images.
+
+Run from the app directory with: python -m benchmarks.similarity
+An index of random hashes, with a near copy of some of them, is searched
+at every --distance. The share of hashes whose distance is computed and
+the time per search are printed next to a scan of every hash.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import django
+
+# Share of the hashes checked by a search at the default distance
+BUDGET = 0.05
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hashes", type=int, default=100000)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--distance", type=int, nargs="+", default=[4, 10, 16])
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from core.imaging import hamming_distance
+    from core.similarity import DEFAULT_DISTANCE, MultiIndexHash
+
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) - (1 << 63) for _ in range(args.hashes)]
+    hashes += [value ^ (1 << rng.randrange(64)) for value in hashes[:1000]]
+    index = MultiIndexHash()
+    for id, value in enumerate(hashes):
+        index.add(value, id)
+    queries = rng.sample(hashes, args.searches)
+
+    print(f"hashes: {len(hashes)}, searches: {args.searches}")
+    within_budget = True
+    for distance in args.distance:
+        checked = statistics.fmean(
+            len(index.candidates(value, distance)) / len(hashes) for value in queries
+        )
+        start = time.perf_counter()
+        for value in queries:
+            index.search(value, distance)
+        search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        start = time.perf_counter()
+        for value in queries:
+            [
+                id
+                for id, other in enumerate(hashes)
+                if hamming_distance(value, other) <= distance
+            ]
+        scan_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(
+            f"distance {distance}: {checked:.2%} of hashes checked, "
+            f"{search_ms:.2f} ms per search, {scan_ms:.2f} ms per scan"
+        )
+        if distance == DEFAULT_DISTANCE:
+            within_budget = checked < BUDGET
+    print(f"budget: {BUDGET:.0%} of hashes checked at distance {DEFAULT_DISTANCE}")
+
+    return 0 if within_budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Benchmark of the cold start of a container.
+
+Run from the app directory with: python -m benchmarks.startup
+The setup steps are timed as separate manage.py commands, the way run.sh
+used to run them, and as the startup command, which skips steps whose
+state is current. Then uWSGI is started with --lazy-apps, where every
+worker loads the app, and preforked from a master with the app preloaded.
+For each mode the time until the server answers, the slowest of the first
+requests, which hit cold workers, and the proportional memory (PSS) of
+all processes are reported.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+OLD_SETUP = [
+    ["wait_for_db"],
+    ["collectstatic", "--noinput"],
+    ["migrate"],
+    ["model_base_setup"],
+]
+SERVER_MODES = {"lazy apps": ["--lazy-apps"], "preforked": []}
+
+
+def run_commands(commands):
+    """Return the seconds taken by running manage.py commands in a row."""
+
+    start = time.perf_counter()
+    for command in commands:
+        subprocess.run(
+            [sys.executable, "manage.py", *command],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+    return time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(port, path):
+    """Return the status of a GET request and its duration in ms."""
+
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    start = time.perf_counter()
+    try:
+        connection.request("GET", path, headers={"Host": "localhost"})
+        status = connection.getresponse().status
+    finally:
+        connection.close()
+    return status, (time.perf_counter() - start) * 1000
+
+
+def process_tree(pid):
+    """Return the pid and the pids of all descendants of a process."""
+
+    pids = [pid]
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/task/{child}/children") as file:
+                pids.extend(int(pid) for pid in file.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def pss_mb(pids):
+    """Return the summed proportional set size of processes in MB."""
+
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as file:
+                for line in file:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return round(total / 1024, 1)
+
+
+def run_server(flags, workers, path):
+    """Start uWSGI and return its readiness, first requests and memory."""
+
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            "uwsgi",
+            "--http",
+            f"127.0.0.1:{port}",
+            "--master",
+            "--workers",
+            str(workers),
+            "--enable-threads",
+            "--need-app",
+            "--die-on-term",
+            "--module",
+            "app.wsgi",
+            *flags,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("uWSGI exited before it was ready.")
+            try:
+                get(port, "/metrics")
+                break
+            except OSError:
+                time.sleep(0.01)
+        ready = time.perf_counter() - start
+
+        # Concurrent requests spread over the workers, cold ones are slowest
+        timings = []
+        threads = [
+            threading.Thread(target=lambda: timings.append(get(port, path)[1]))
+            for _ in range(workers * 2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            "ready_s": round(ready, 3),
+            "first_requests_max_ms": round(max(timings), 1),
+            "first_requests_median_ms": round(statistics.median(timings), 1),
+            "pss_mb": pss_mb(process_tree(server.pid)),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--path", default="/api/user/images/")
+    parser.add_argument("--skip-setup", action="store_true")
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    results = {}
+
+    if not args.skip_setup:
+        results["setup_s"] = {
+            "separate commands": round(
+                statistics.median(
+                    run_commands(OLD_SETUP) for _ in range(args.repeat)
+                ),
+                3,
+            ),
+            "startup command": round(
+                statistics.median(
+                    run_commands([["startup"]]) for _ in range(args.repeat)
+                ),
+                3,
+            ),
+        }
+        for name, seconds in results["setup_s"].items():
+            print(f"setup, {name:18} {seconds:8.3f} s")
+
+    results["servers"] = {}
+    for name, flags in SERVER_MODES.items():
+        runs = [
+            run_server(flags, args.workers, args.path) for _ in range(args.repeat)
+        ]
+        summary = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        results["servers"][name] = summary
+        print(
+            f"uwsgi, {name:12} ready {summary['ready_s']:6.3f} s, "
+            f"first requests max {summary['first_requests_max_ms']:7.1f} ms, "
+            f"median {summary['first_requests_median_ms']:7.1f} ms, "
+            f"PSS {summary['pss_mb']:6.1f} MB"
+        )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Latency statistics shared by the benchmarks.
+"""
+
+import statistics
+
+
+def percentile(values, fraction):
+    """Return the given percentile of sorted values."""
+
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(timings):
+    """Return the count, mean and percentiles of timings in milliseconds."""
+
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "mean_ms": round(statistics.fmean(timings), 2) if timings else 0,
+        "p50_ms": round(percentile(timings, 0.50), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+    }
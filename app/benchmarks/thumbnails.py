@@ -0,0 +1,233 @@
+"""
+Microbenchmark of the thumbnail engine in core.imaging.
+
+Run from the app directory with: python -m benchmarks.thumbnails
+Every source format and size is decoded, resized to every thumbnail height
+of the base tiers with every resampling filter and encoded back. Time and
+peak memory are reported per stage, memory as the peak growth of the
+memory allocated during the stage. Rows flagged "default" use the filter
+production applies to the decoded mode, "applied_resampler" tells the one
+Pillow really used.
+"""
+
+import argparse
+import contextlib
+import ctypes
+import io
+import json
+import os
+import statistics
+import threading
+import time
+
+import PIL.Image
+import django
+
+FORMATS = ["JPEG", "PNG", "GIF", "WEBP"]
+MEGAPIXELS = [0.3, 2, 12, 24, 48]
+RESAMPLERS = {filter.name: filter for filter in PIL.Image.Resampling}
+
+
+def applied_resampler(mode, name=None):
+    """Return the filter Image.resize() applies to images of a mode.
+
+    Without a filter, as in production, it uses BICUBIC or NEAREST for
+    special modes like "I;16". Palette and bilevel images (GIF) are always
+    resized with NEAREST, whatever filter is asked for.
+    """
+
+    if mode in ("1", "P"):
+        return "NEAREST"
+    if name is None:
+        return "NEAREST" if ";" in mode else "BICUBIC"
+    return name
+
+
+class MallInfo2(ctypes.Structure):
+    _fields_ = [
+        (name, ctypes.c_size_t)
+        for name in (
+            "arena",
+            "ordblks",
+            "smblks",
+            "hblks",
+            "hblkhd",
+            "usmblks",
+            "fsmblks",
+            "uordblks",
+            "fordblks",
+            "keepcost",
+        )
+    ]
+
+
+def allocated_bytes_reader():
+    """Return a function reading the bytes allocated by malloc or None.
+
+    Pillow allocates image buffers with malloc, out of sight of tracemalloc,
+    so glibc's mallinfo2() is used, or the resident set size without glibc.
+    """
+
+    mallinfo2 = getattr(ctypes.CDLL(None), "mallinfo2", None)
+    if mallinfo2 is not None:
+        mallinfo2.restype = MallInfo2
+
+        def allocated():
+            info = mallinfo2()
+            return info.uordblks + info.hblkhd
+
+        return allocated
+
+    if os.path.exists("/proc/self/statm"):
+        page_size = os.sysconf("SC_PAGE_SIZE")
+
+        def resident():
+            with open("/proc/self/statm") as file:
+                return int(file.read().split()[1]) * page_size
+
+        return resident
+
+    return None
+
+
+class PeakMemory:
+    """Sample allocated memory in a thread and keep the peak growth."""
+
+    interval = 0.001
+
+    def __init__(self, read):
+        self.read = read
+        self.peak = 0
+
+    def sample(self):
+        while not self.done.is_set():
+            self.peak = max(self.peak, self.read() - self.start)
+            self.done.wait(self.interval)
+
+    def __enter__(self):
+        self.done = threading.Event()
+        self.start = self.read()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.peak = max(self.peak, self.read() - self.start)
+        self.done.set()
+        self.thread.join()
+
+
+def measure(function, repeat, read_memory):
+    """Return the result, median time in ms and peak memory in MB of calls."""
+
+    timings = []
+    peaks = []
+    for _ in range(repeat):
+        result = None
+        memory = PeakMemory(read_memory) if read_memory else None
+        with memory or contextlib.nullcontext():
+            start = time.perf_counter()
+            result = function()
+            timings.append((time.perf_counter() - start) * 1000)
+        if memory:
+            peaks.append(memory.peak)
+
+    peak_mb = round(max(peaks) / 2**20, 1) if peaks else None
+    return result, round(statistics.median(timings), 2), peak_mb
+
+
+def source_image(megapixels, image_format):
+    """Return an encoded 4:3 test image of about the given size."""
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    fractal = PIL.Image.effect_mandelbrot(
+        (width // 8, height // 8), (-2.0, -1.2, 1.0, 1.2), 64
+    ).resize((width, height))
+    noise = PIL.Image.effect_noise((width, height), 32)
+    gradient = PIL.Image.linear_gradient("L").resize((width, height))
+    image = PIL.Image.merge("RGB", (fractal, noise, gradient))
+    if image_format == "GIF":
+        image = image.convert("P")
+
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue(), (width, height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--formats", nargs="+", default=FORMATS)
+    parser.add_argument("--megapixels", nargs="+", type=float, default=MEGAPIXELS)
+    parser.add_argument("--resamplers", nargs="+", default=list(RESAMPLERS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the results to a JSON file.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from core.imaging import decode_image, encode_image, resize_image
+    from core.management.commands.model_base_setup import BASE_TIERS
+
+    heights = sorted({height for *_, sizes in BASE_TIERS for height in sizes})
+    # Benchmarked sources are larger than the upload limits on purpose
+    PIL.Image.MAX_IMAGE_PIXELS = None
+    read_memory = allocated_bytes_reader()
+
+    results = []
+    print(
+        f"{'format':6} {'MP':>5} {'height':>6} {'resampler':9} "
+        f"{'decode ms':>10} {'resize ms':>10} {'encode ms':>10} "
+        f"{'decode MB':>10} {'resize MB':>10} {'encode MB':>10}"
+    )
+    for image_format in args.formats:
+        for megapixels in args.megapixels:
+            data, size = source_image(megapixels, image_format)
+            decoded, decode_ms, decode_mb = measure(
+                lambda: decode_image(io.BytesIO(data)), args.repeat, read_memory
+            )
+            mode = decoded.image.mode
+            for height in heights:
+                for name in args.resamplers:
+                    resized, resize_ms, resize_mb = measure(
+                        lambda: resize_image(decoded, height, RESAMPLERS[name]),
+                        args.repeat,
+                        read_memory,
+                    )
+                    buffer, encode_ms, encode_mb = measure(
+                        lambda: encode_image(resized, decoded.format),
+                        args.repeat,
+                        read_memory,
+                    )
+                    row = {
+                        "format": image_format,
+                        "megapixels": megapixels,
+                        "source_size": size,
+                        "source_bytes": len(data),
+                        "height": height,
+                        "resampler": name,
+                        "applied_resampler": applied_resampler(mode, name),
+                        "default": name == applied_resampler(mode),
+                        "decode_ms": decode_ms,
+                        "resize_ms": resize_ms,
+                        "encode_ms": encode_ms,
+                        "decode_mb": decode_mb,
+                        "resize_mb": resize_mb,
+                        "encode_mb": encode_mb,
+                        "thumbnail_bytes": buffer.getbuffer().nbytes,
+                    }
+                    results.append(row)
+                    print(
+                        f"{image_format:6} {megapixels:5} {height:6} {name:9} "
+                        f"{decode_ms:10} {resize_ms:10} {encode_ms:10} "
+                        f"{decode_mb!s:>10} {resize_mb!s:>10} {encode_mb!s:>10}"
+                    )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
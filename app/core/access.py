@@ -0,0 +1,112 @@
+"""
+Counting of expiring link hits with write-behind to the database.
+
+Hits are added up in memory by every worker. A thread of the worker adds
+them to AccessCount rows in one upsert per flush, every
+ACCESS_FLUSH_SECONDS or sooner once ACCESS_FLUSH_MAX_KEYS links were hit.
+A worker that dies loses at most the hits since its last flush.
+"""
+
+import atexit
+import collections
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+from django.utils import timezone
+
+from core.models import AccessCount
+
+logger = logging.getLogger(__name__)
+
+UPSERT_SQL = (
+    f"INSERT INTO {AccessCount._meta.db_table} (day, link_id, file, hits) "
+    "VALUES {values} "
+    "ON CONFLICT (day, link_id) "
+    f"DO UPDATE SET hits = {AccessCount._meta.db_table}.hits + EXCLUDED.hits"
+)
+
+
+class AccessCounter:
+    """Hits per day and link of a worker, waiting to be flushed."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = collections.Counter()
+        # Set in server processes, which flush from a thread of every worker
+        self.background = False
+        self.flusher_pid = None
+        self.wake = threading.Event()
+
+    def hit(self, link_id, file):
+        """Count a hit of the link to the file."""
+
+        key = (timezone.now().date(), link_id, file)
+        with self.lock:
+            self.pending[key] += 1
+            full = len(self.pending) >= settings.ACCESS_FLUSH_MAX_KEYS
+        if self.background and self.flusher_pid != os.getpid():
+            self.start_flusher()
+        if full:
+            self.wake.set()
+
+    def start_flusher(self):
+        """Start the flushing thread of this process."""
+
+        # Threads do not survive forks, every worker starts its own
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+        threading.Thread(
+            target=self.flush_periodically, name="access-flush", daemon=True
+        ).start()
+
+    def flush_periodically(self):
+        """Flush every ACCESS_FLUSH_SECONDS or when woken up by many hits."""
+
+        while True:
+            self.wake.wait(settings.ACCESS_FLUSH_SECONDS)
+            self.wake.clear()
+            try:
+                self.flush()
+                # The thread keeps its connection between flushes as requests do
+                close_old_connections()
+            except Exception:
+                logger.exception("Flushing access counts failed.")
+
+    def flush(self):
+        """Add the pending hits to the database in one statement."""
+
+        with self.lock:
+            pending, self.pending = self.pending, collections.Counter()
+        if not pending:
+            return
+
+        params = []
+        # Rows are locked in the order they are listed, a fixed order keeps
+        # workers flushing the same links at once from deadlocking
+        for (day, link_id, file), hits in sorted(pending.items()):
+            params.extend([day, link_id, file, hits])
+        values = ", ".join(["(%s, %s, %s, %s)"] * len(pending))
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(UPSERT_SQL.format(values=values), params)
+        except DatabaseError:
+            logger.exception("Flushing %d access counts failed.", len(pending))
+            # Kept for the next flush, bounded by the keys of one flush
+            with self.lock:
+                if len(self.pending) < settings.ACCESS_FLUSH_MAX_KEYS:
+                    self.pending.update(pending)
+
+
+access_counter = AccessCounter()
+
+
+def flush_in_background():
+    """Flush the hits of server workers from a thread and when they exit."""
+
+    access_counter.background = True
+    atexit.register(access_counter.flush)
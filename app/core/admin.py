@@ -2,8 +2,14 @@
 Django admin customization.
 """
 
+import json
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
 from core import models
 
@@ -39,8 +45,117 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Define the admin pages for request profiles."""
+
+    ordering = ["-created"]
+    list_display = [
+        "created",
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "user",
+    ]
+    list_filter = ("method", "status_code")
+    search_fields = ("path",)
+    fields = (
+        "created",
+        "user",
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "downloads",
+        "summary",
+        "sql",
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/<str:kind>/",
+                self.admin_site.admin_view(self.download),
+                name="core_requestprofile_download",
+            ),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        """Send the profile as a pstats file or the queries as JSON."""
+
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(models.RequestProfile, pk=pk)
+        if kind == "stats":
+            response = HttpResponse(
+                bytes(profile.stats), content_type="application/octet-stream"
+            )
+            filename = f"profile-{pk}.prof"
+        elif kind == "queries":
+            response = HttpResponse(
+                json.dumps(profile.queries, indent=2),
+                content_type="application/json",
+            )
+            filename = f"profile-{pk}-queries.json"
+        else:
+            return HttpResponse(status=404)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.display(description="Download")
+    def downloads(self, obj):
+        url = "admin:core_requestprofile_download"
+        return format_html(
+            '<a href="{}">cProfile stats</a> | <a href="{}">SQL queries</a>',
+            reverse(url, args=[obj.pk, "stats"]),
+            reverse(url, args=[obj.pk, "queries"]),
+        )
+
+    @admin.display(description="Slowest functions")
+    def summary(self, obj):
+        return format_html("<pre>{}</pre>", obj.stats_summary())
+
+    @admin.display(description="SQL")
+    def sql(self, obj):
+        return format_html(
+            "<pre>{}</pre>",
+            "\n\n".join(
+                f"[{query['alias']}, {query['duration_ms']:.2f} ms] {query['sql']}"
+                for query in obj.queries
+            ),
+        )
+
+
+class RevokedLinkAdmin(admin.ModelAdmin):
+    """Define the admin pages for revoked expiring links."""
+
+    ordering = ["-created"]
+    list_display = ["link_id", "user", "expires", "created"]
+    list_select_related = ["user"]
+    search_fields = ["link_id", "user__username"]
+
+
+class AccessCountAdmin(admin.ModelAdmin):
+    """Define the admin pages for hits of expiring links per day."""
+
+    ordering = ["-day", "-hits"]
+    list_display = ["day", "file", "link_id", "hits"]
+    date_hierarchy = "day"
+    search_fields = ["file", "link_id"]
+
+
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Tier)
 admin.site.register(models.ThumbnailSize)
 admin.site.register(models.Image)
 admin.site.register(models.Thumbnail)
+admin.site.register(models.StorageUsage)
+admin.site.register(models.RequestProfile, RequestProfileAdmin)
+admin.site.register(models.RevokedLink, RevokedLinkAdmin)
+admin.site.register(models.AccessCount, AccessCountAdmin)
@@ -0,0 +1,111 @@
+"""
+PostgreSQL backend keeping idle connections in a per-process pool.
+
+Django drops a connection when its request finishes or, in ASGI mode, when
+the request thread goes away. This backend hands closed connections back to
+a pool shared by all threads of the process instead, so the next request
+skips the connection handshake.
+"""
+
+import threading
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE as IDLE
+
+from django.db.backends.postgresql import base
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Thread-safe stack of up to `size` idle connections."""
+
+    def __init__(self, size):
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Return an idle connection or None when there is none."""
+
+        with self.lock:
+            return self.idle.pop() if self.idle else None
+
+    def put(self, connection):
+        """Keep a connection for reuse, return False when the pool is full."""
+
+        with self.lock:
+            if len(self.idle) >= self.size:
+                return False
+            self.idle.append(connection)
+            return True
+
+    def clear(self):
+        """Close all idle connections."""
+
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
+def get_pool(alias, size):
+    """Return the pool of the database alias, creating it on first use."""
+
+    with pools_lock:
+        if alias not in pools:
+            pools[alias] = ConnectionPool(size)
+        return pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL database wrapper borrowing connections from a pool."""
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get("POOL_SIZE", 10))
+
+    def get_new_connection(self, conn_params):
+        while connection := self.pool.get():
+            if self.is_alive(connection):
+                self.isolation_level = self.settings_dict["OPTIONS"].get(
+                    "isolation_level", connection.isolation_level
+                )
+                return connection
+            connection.close()
+
+        return super().get_new_connection(conn_params)
+
+    def is_alive(self, connection):
+        """Check an idle connection, the server may have dropped it meanwhile."""
+
+        if connection.closed:
+            return False
+        if not self.settings_dict["CONN_HEALTH_CHECKS"]:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            # The ping opened a transaction unless autocommit was on
+            connection.rollback()
+        except base.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        connection = self.connection
+        if connection is None:
+            return
+
+        if not connection.closed and connection.info.transaction_status != IDLE:
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                pass
+        if (
+            connection.closed
+            or connection.info.transaction_status != IDLE
+            or not self.pool.put(connection)
+        ):
+            with self.wrap_database_errors:
+                connection.close()
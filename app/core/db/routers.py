@@ -0,0 +1,73 @@
+"""
+Database router sending reads of read-only requests to replicas.
+"""
+
+import contextlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Set for the duration of requests whose reads may go to a replica
+replica_reads = ContextVar("replica_reads", default=False)
+
+# Seeded by the OS, uWSGI forks workers without reseeding the random module
+system_random = random.SystemRandom()
+
+
+def pin_key(user_id):
+    return f"replica:pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Read from the primary for the user until replicas caught up on a write."""
+
+    if settings.DATABASE_REPLICAS:
+        caches["shared"].set(pin_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    """Return True if the user wrote recently and must read from the primary."""
+
+    return caches["shared"].get(pin_key(user_id)) is not None
+
+
+def replica_reads_allowed(user_id):
+    """Return True if reads for the user can be sent to a replica."""
+
+    return bool(settings.DATABASE_REPLICAS) and not is_pinned(user_id)
+
+
+@contextlib.contextmanager
+def read_from_replica(enabled=True):
+    """Send reads within the block to a replica if enabled."""
+
+    token = replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """Route reads to a random replica inside read_from_replica blocks.
+
+    Replicas hold the same data as the primary, so relations between objects
+    read from different databases are allowed and only the primary migrates.
+    """
+
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() and settings.DATABASE_REPLICAS:
+            return system_random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read from a replica are saved to the primary too
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,344 @@
+"""
+Image processing helpers.
+"""
+
+import io
+import hashlib
+import math
+import warnings
+from dataclasses import dataclass
+
+from django.conf import settings
+
+import PIL.Image
+
+# EXIF tags worth keeping once the metadata is stripped from the image
+EXIF_ORIENTATION = 0x0112
+EXIF_SUMMARY_TAGS = {0x010F: "make", 0x0110: "model", 0x0131: "software"}
+EXIF_IFD = 0x8769
+EXIF_IFD_SUMMARY_TAGS = {0x9003: "taken_at"}
+
+ORIENTATION_TRANSPOSE = {
+    2: PIL.Image.Transpose.FLIP_LEFT_RIGHT,
+    3: PIL.Image.Transpose.ROTATE_180,
+    4: PIL.Image.Transpose.FLIP_TOP_BOTTOM,
+    5: PIL.Image.Transpose.TRANSPOSE,
+    6: PIL.Image.Transpose.ROTATE_270,
+    7: PIL.Image.Transpose.TRANSVERSE,
+    8: PIL.Image.Transpose.ROTATE_90,
+}
+
+# Image info entries that describe pixels rather than metadata
+KEPT_INFO_KEYS = ("transparency",)
+
+# Side of the sample placeholders and hashes are computed from, in pixels
+PLACEHOLDER_SAMPLE_SIZE = 32
+# Transparent areas of samples are shown on neutral gray
+PLACEHOLDER_BACKGROUND = (128, 128, 128)
+# Cosine components of blurhash placeholders across and down the image
+BLURHASH_COMPONENTS = (4, 3)
+BASE83_CHARACTERS = (
+    "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+    "#$%*+,-.:;=?@[]^_{|}~"
+)
+
+
+class ImageTooLarge(Exception):
+    """Raised when an image exceeds the allowed pixel or byte budget."""
+
+
+def get_image_limits(user):
+    """Return the (max_pixels, max_bytes) budget for the user's uploads."""
+
+    max_pixels = settings.IMAGE_MAX_PIXELS
+    max_bytes = settings.IMAGE_MAX_BYTES
+    tier = getattr(user, "tier", None)
+    if tier:
+        max_pixels = tier.max_image_pixels or max_pixels
+        max_bytes = tier.max_image_bytes or max_bytes
+
+    return max_pixels, max_bytes
+
+
+def read_image_header(file):
+    """Return (width, height, format) of an image without decoding pixels."""
+
+    position = file.tell()
+    file.seek(0)
+    try:
+        # Pillow only parses the header on open, the decoding happens on load()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", PIL.Image.DecompressionBombWarning)
+            with PIL.Image.open(file) as img:
+                return img.width, img.height, img.format
+    except PIL.Image.DecompressionBombError as error:
+        raise ImageTooLarge(str(error))
+    finally:
+        file.seek(position)
+
+
+def check_image_budget(file, user):
+    """Raise ImageTooLarge if the file is over the user's upload budget."""
+
+    max_pixels, max_bytes = get_image_limits(user)
+    if file.size > max_bytes:
+        raise ImageTooLarge(f"Image file exceeds the limit of {max_bytes} bytes.")
+
+    width, height, _ = read_image_header(file)
+    if width * height > max_pixels:
+        raise ImageTooLarge(
+            f"Image resolution exceeds the limit of {max_pixels} pixels."
+        )
+
+
+def file_digest(file):
+    """Return the SHA-256 hex digest of a file, keeping its position."""
+
+    position = file.tell()
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(64 * 1024), b""):
+        digest.update(chunk)
+    file.seek(position)
+
+    return digest.hexdigest()
+
+
+def read_image_metadata(file):
+    """Return upright (width, height), format and EXIF summary from the header."""
+
+    position = file.tell()
+    file.seek(0)
+    try:
+        with PIL.Image.open(file) as img:
+            exif = img.getexif()
+            width, height = img.size
+            if exif.get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height, img.format, summarize_exif(exif)
+    finally:
+        file.seek(position)
+
+
+@dataclass
+class DecodedImage:
+    """An upright, fully decoded image with its extracted metadata."""
+
+    image: PIL.Image.Image
+    format: str
+    exif: dict
+    icc_profile: bytes = None
+
+    @property
+    def width(self):
+        return self.image.width
+
+    @property
+    def height(self):
+        return self.image.height
+
+
+def summarize_exif(exif):
+    """Return the JSON-serializable subset of EXIF data kept on the image."""
+
+    summary = {}
+    tags = [(exif, EXIF_SUMMARY_TAGS), (exif.get_ifd(EXIF_IFD), EXIF_IFD_SUMMARY_TAGS)]
+    for data, names in tags:
+        for tag, name in names.items():
+            value = data.get(tag)
+            if isinstance(value, bytes):
+                value = value.decode("utf-8", "ignore")
+            if isinstance(value, str) and value.strip("\x00 "):
+                summary[name] = value.strip("\x00 ")
+    if exif.get(EXIF_ORIENTATION) in ORIENTATION_TRANSPOSE:
+        summary["orientation"] = exif[EXIF_ORIENTATION]
+
+    return summary
+
+
+def decode_image(file):
+    """Decode an image once and rotate it upright according to its EXIF."""
+
+    img = PIL.Image.open(file)
+    image_format = img.format
+    exif = img.getexif()
+    icc_profile = img.info.get("icc_profile")
+    img.load()
+
+    method = ORIENTATION_TRANSPOSE.get(exif.get(EXIF_ORIENTATION))
+    if method is not None:
+        img = img.transpose(method)
+
+    return DecodedImage(img, image_format, summarize_exif(exif), icc_profile)
+
+
+def difference_hash(sample, size=8):
+    """Return the dHash of an image sample as a signed 64-bit integer.
+
+    The sample is shrunk to (size + 1) x size gray pixels and every bit tells
+    whether a pixel is brighter than its right neighbour, so re-encoded,
+    resized or slightly edited copies get hashes a few bits apart.
+    """
+
+    pixels = list(
+        sample.resize((size + 1, size), PIL.Image.Resampling.BOX)
+        .convert("L")
+        .getdata()
+    )
+    value = 0
+    for row in range(size):
+        for column in range(size):
+            left = pixels[row * (size + 1) + column]
+            value = (value << 1) | (left > pixels[row * (size + 1) + column + 1])
+
+    # Stored in a bigint column
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming_distance(first, second):
+    """Return the number of differing bits of two 64-bit hashes."""
+
+    return ((first ^ second) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def placeholder_sample(img):
+    """Return a small RGB copy of an image to compute placeholders and hashes from.
+
+    Transparent areas are composited onto PLACEHOLDER_BACKGROUND rather than
+    counted as black.
+    """
+
+    if img.mode not in ("L", "RGB", "RGBA"):
+        transparent = "A" in img.getbands() or "transparency" in img.info
+        img = img.convert("RGBA" if transparent else "RGB")
+    size = PLACEHOLDER_SAMPLE_SIZE
+    # Box filtering reads every pixel once, the rest works on the sample
+    sample = img.resize((size, size), PIL.Image.Resampling.BOX)
+    if sample.mode == "RGBA":
+        background = PIL.Image.new("RGB", sample.size, PLACEHOLDER_BACKGROUND)
+        background.paste(sample, mask=sample)
+        return background
+    return sample.convert("RGB")
+
+
+def dominant_color(sample):
+    """Return the most common color of a sample as "#rrggbb"."""
+
+    quantized = sample.quantize(colors=5, method=PIL.Image.Quantize.MEDIANCUT)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def base83(value, length):
+    return "".join(
+        BASE83_CHARACTERS[value // 83 ** (length - i - 1) % 83] for i in range(length)
+    )
+
+
+def srgb_to_linear(value):
+    value /= 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def linear_to_srgb(value):
+    value = min(max(value, 0), 1)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def encode_blurhash(sample, components=BLURHASH_COMPONENTS):
+    """Return the blurhash of a sample, a short string clients blur into a preview.
+
+    The sample is described by the lowest frequency cosines of its linear
+    RGB values, see https://github.com/woltapp/blurhash for the format.
+    """
+
+    columns, rows = components
+    width, height = sample.size
+    bands = [[srgb_to_linear(v) for v in band.getdata()] for band in sample.split()]
+    cos_x = [
+        [math.cos(math.pi * i * x / width) for x in range(width)]
+        for i in range(columns)
+    ]
+    cos_y = [
+        [math.cos(math.pi * j * y / height) for y in range(height)]
+        for j in range(rows)
+    ]
+
+    # The basis is separable, so every row is summed once per column frequency
+    row_sums = [
+        [
+            [
+                sum(map(float.__mul__, cos_x[i], band[y * width:(y + 1) * width]))
+                for y in range(height)
+            ]
+            for i in range(columns)
+        ]
+        for band in bands
+    ]
+    factors = []
+    for j in range(rows):
+        for i in range(columns):
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append(
+                [
+                    scale * sum(map(float.__mul__, cos_y[j], sums[i]))
+                    for sums in row_sums
+                ]
+            )
+
+    dc, ac = factors[0], factors[1:]
+    result = base83(columns - 1 + (rows - 1) * 9, 1)
+    maximum = 1
+    if ac:
+        largest = max(abs(value) for factor in ac for value in factor)
+        quantized_max = max(0, min(82, int(largest * 166 - 0.5)))
+        maximum = (quantized_max + 1) / 166
+        result += base83(quantized_max, 1)
+    else:
+        result += base83(0, 1)
+
+    red, green, blue = (linear_to_srgb(value) for value in dc)
+    result += base83((red << 16) + (green << 8) + blue, 4)
+    for factor in ac:
+        red, green, blue = (
+            max(0, min(18, int(math.copysign(abs(v / maximum) ** 0.5, v) * 9 + 9.5)))
+            for v in factor
+        )
+        result += base83(red * 19 * 19 + green * 19 + blue, 2)
+
+    return result
+
+
+def thumbnail_width(width, height, thumbnail_height):
+    """Return the width of a thumbnail keeping the original aspect ratio."""
+
+    return max(1, int(width / (height / thumbnail_height)))
+
+
+def resize_image(decoded, height, resample=None):
+    """Resize a decoded image to the given height."""
+
+    width = thumbnail_width(decoded.width, decoded.height, height)
+    return decoded.image.resize((width, height), resample)
+
+
+def encode_image(img, image_format, icc_profile=None):
+    """Encode an image into a buffer without any metadata but the ICC profile."""
+
+    img.info = {key: img.info[key] for key in KEPT_INFO_KEYS if key in img.info}
+    params = {"icc_profile": icc_profile} if icc_profile else {}
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, **params)
+    buffer.seek(0)
+
+    return buffer
+
+
+def render_thumbnail(decoded, height):
+    """Return the (width, buffer) of a thumbnail of the given height."""
+
+    resized = resize_image(decoded, height)
+    return resized.width, encode_image(resized, decoded.format, decoded.icc_profile)
@@ -0,0 +1,67 @@
+"""
+Django command to fill in perceptual hashes and placeholders of images
+uploaded before they were stored.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.imaging import (
+    decode_image,
+    difference_hash,
+    dominant_color,
+    encode_blurhash,
+    placeholder_sample,
+)
+from core.models import Image
+from core.similarity import invalidate_similarity_index
+
+
+class Command(BaseCommand):
+    """Django command to fill in missing perceptual hashes and placeholders."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Hash every image again, as after a change of the hashing.",
+        )
+
+    def handle(self, *args, **kwargs):
+        """Entrypoint for command."""
+
+        batch_size = kwargs["batch_size"]
+        fields = ["dhash", "blurhash", "dominant_color"]
+        queryset = Image.objects.only("id", "user", "image")
+        if not kwargs["all"]:
+            queryset = queryset.filter(
+                Q(dhash__isnull=True) | Q(blurhash="") | Q(dominant_color="")
+            )
+        batch = []
+        count = 0
+        users = set()
+        for image in queryset.iterator(chunk_size=batch_size):
+            try:
+                with image.image.open("rb") as file:
+                    decoded = decode_image(file)
+            except (OSError, ValueError) as error:
+                self.stdout.write(self.style.WARNING(f"Skipping {image.pk}: {error}"))
+                continue
+            sample = placeholder_sample(decoded.image)
+            image.dhash = difference_hash(sample)
+            image.blurhash = encode_blurhash(sample)
+            image.dominant_color = dominant_color(sample)
+            batch.append(image)
+            users.add(image.user_id)
+
+            if len(batch) >= batch_size:
+                count += Image.objects.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            count += Image.objects.bulk_update(batch, fields)
+
+        for user_id in users:
+            invalidate_similarity_index(user_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Hashed {count} images."))
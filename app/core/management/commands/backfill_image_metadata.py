@@ -0,0 +1,72 @@
+"""
+Django command to fill in metadata of images uploaded before it was stored.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.imaging import file_digest, read_image_metadata
+from core.models import Image, Thumbnail, StorageUsage
+
+
+class Command(BaseCommand):
+    """Django command to fill in missing image and thumbnail metadata."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **kwargs):
+        """Entrypoint for command."""
+
+        batch_size = kwargs["batch_size"]
+        images = self.backfill(
+            Image.objects.filter(Q(width__isnull=True) | Q(content_hash="")),
+            "image",
+            ["width", "height", "file_size", "format", "content_hash", "exif"],
+            batch_size,
+        )
+        thumbnails = self.backfill(
+            Thumbnail.objects.filter(Q(width__isnull=True) | Q(content_hash="")),
+            "thumbnail",
+            ["width", "file_size", "format", "content_hash"],
+            batch_size,
+        )
+        # Counted sizes of the backfilled files were missing until now
+        StorageUsage.objects.recount()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backfilled {images} images and {thumbnails} thumbnails."
+            )
+        )
+
+    def backfill(self, queryset, field_name, fields, batch_size):
+        """Read metadata from the files of the queryset and save it in batches."""
+
+        batch = []
+        count = 0
+        for obj in queryset.iterator(chunk_size=batch_size):
+            field = getattr(obj, field_name)
+            try:
+                with field.open("rb") as file:
+                    obj.content_hash = file_digest(file)
+                    width, height, image_format, exif = read_image_metadata(file)
+            except (OSError, ValueError) as error:
+                self.stdout.write(self.style.WARNING(f"Skipping {obj.pk}: {error}"))
+                continue
+
+            obj.width = width
+            obj.file_size = field.size
+            obj.format = image_format
+            if field_name == "image":
+                obj.height = height
+                obj.exif = exif
+            batch.append(obj)
+
+            if len(batch) >= batch_size:
+                count += queryset.model.objects.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            count += queryset.model.objects.bulk_update(batch, fields)
+
+        return count
@@ -7,6 +7,13 @@ from django.contrib.auth import get_user_model
 
 from core.models import Tier, ThumbnailSize
 
+# Name, options and thumbnail heights of the tiers created on the first boot
+BASE_TIERS = [
+    ("Basic", {}, [200]),
+    ("Premium", {"original_size": True}, [200, 400]),
+    ("Enterprise", {"original_size": True, "expiring_link": True}, [200, 400]),
+]
+
 
 class Command(BaseCommand):
     """Django command to fill the database with basic tiers data."""
@@ -20,15 +27,9 @@ class Command(BaseCommand):
                 password="admin",
             )
         if Tier.objects.count() == 0:
-            basic = Tier.objects.create(name="Basic")
-            premium = Tier.objects.create(name="Premium", original_size=True)
-            enterprise = Tier.objects.create(
-                name="Enterprise", original_size=True, expiring_link=True
-            )
-            ThumbnailSize.objects.create(tier=basic, height=200)
-            ThumbnailSize.objects.create(tier=premium, height=200)
-            ThumbnailSize.objects.create(tier=premium, height=400)
-            ThumbnailSize.objects.create(tier=enterprise, height=200)
-            ThumbnailSize.objects.create(tier=enterprise, height=400)
+            for name, options, heights in BASE_TIERS:
+                tier = Tier.objects.create(name=name, **options)
+                for height in heights:
+                    ThumbnailSize.objects.create(tier=tier, height=height)
 
         self.stdout.write(self.style.WARNING("Base setup ready!"))
@@ -0,0 +1,95 @@
+"""
+Django command running the setup steps of a container start.
+"""
+
+import contextlib
+import hashlib
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+
+# Serializes the setup of containers starting at the same time
+SETUP_LOCK_ID = 0x1A6E5E7
+
+STATIC_STAMP = ".collectstatic-stamp"
+
+
+def static_files_digest():
+    """Return a digest of the names, sizes and times of the static sources."""
+
+    digest = hashlib.sha256()
+    for finder in get_finders():
+        for path, storage in sorted(finder.list(["CVS", ".*", "*~"])):
+            stat = os.stat(storage.path(path))
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def setup_lock():
+    """Hold a PostgreSQL advisory lock for the duration of the block.
+
+    The lock is taken in a transaction of a connection of its own, as some
+    migrations can not run in a transaction and session locks do not hold
+    behind pgbouncer in transaction mode.
+    """
+
+    lock_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        lock_connection.set_autocommit(False)
+        with lock_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [SETUP_LOCK_ID])
+        yield
+    finally:
+        # Ending the transaction releases the lock
+        lock_connection.close()
+
+
+class Command(BaseCommand):
+    """Django command running the setup steps whose state is not current."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Run every step regardless."
+        )
+
+    def handle(self, *args, **kwargs):
+        """Entrypoint for command."""
+
+        force = kwargs["force"]
+        call_command("wait_for_db", stdout=self.stdout)
+        with setup_lock():
+            self.collect_static(force)
+            self.migrate(force)
+            call_command("model_base_setup", stdout=self.stdout)
+
+    def collect_static(self, force):
+        """Collect static files unless the sources are unchanged."""
+
+        stamp_path = os.path.join(settings.STATIC_ROOT, STATIC_STAMP)
+        digest = static_files_digest()
+        if not force and os.path.exists(stamp_path):
+            with open(stamp_path) as file:
+                if file.read() == digest:
+                    self.stdout.write("Static files are up to date.")
+                    return
+
+        call_command("collectstatic", interactive=False, stdout=self.stdout)
+        with open(stamp_path, "w") as file:
+            file.write(digest)
+
+    def migrate(self, force):
+        """Apply migrations unless there are none left to apply."""
+
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not force and not plan:
+            self.stdout.write("Migrations are up to date.")
+            return
+
+        call_command("migrate", interactive=False, stdout=self.stdout)
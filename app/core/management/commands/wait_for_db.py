@@ -6,24 +6,39 @@ import time
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """Django command to wait for the database"""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="Give up after this many seconds, 0 checks once (readiness).",
+        )
+
     def handle(self, *args, **kwargs):
         """Entrypoint for command."""
         self.stdout.write("Waiting for database...")
+        timeout = kwargs["timeout"]
+        deadline = None if timeout is None else time.monotonic() + timeout
         db_up = False
 
         while not db_up:
             try:
                 self.check(databases=["default"])
+                # System checks do not connect to PostgreSQL
+                connections["default"].ensure_connection()
                 db_up = True
 
             except (Psycopg2OpError, OperationalError):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise CommandError("Database unavailable.")
                 self.stdout.write("Database unavailable, waiting 1 second...")
                 time.sleep(1)
 
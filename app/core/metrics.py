@@ -0,0 +1,122 @@
+"""
+Prometheus metrics of the app.
+
+With PROMETHEUS_MULTIPROC_DIR set, every worker process writes its samples
+to files in that directory and the metrics view adds them up, so uWSGI and
+gunicorn workers are reported as one app.
+"""
+
+import contextlib
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from django.db import connections
+
+REQUEST_DURATION = Histogram(
+    "image_api_request_duration_seconds",
+    "Time spent in API views.",
+    ["view", "action"],
+)
+REQUESTS = Counter(
+    "image_api_requests_total",
+    "API responses by status code.",
+    ["view", "action", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "image_api_request_db_queries",
+    "Database queries per API request.",
+    ["view", "action"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf")),
+)
+IMAGE_DECODE_DURATION = Histogram(
+    "image_decode_duration_seconds",
+    "Time spent decoding uploaded images.",
+    ["format"],
+)
+THUMBNAIL_RENDER_DURATION = Histogram(
+    "thumbnail_render_duration_seconds",
+    "Time spent resizing and encoding a thumbnail.",
+    ["format"],
+)
+EXPIRING_LINKS = Counter(
+    "expiring_link_requests_total",
+    "Requests of expiring links by result.",
+    ["result"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by result.",
+    ["cache", "result"],
+)
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextlib.contextmanager
+def observe_request(view, action=None, count_queries=True):
+    """Record the duration, query count and status of an API request.
+
+    Yields a dict where the block stores the response "status" and the
+    "action" if it is only known later. Queries of async views run in other
+    threads and are not counted.
+    """
+
+    counter = QueryCounter()
+    labels = {"status": 500, "action": action}
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if count_queries:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+        try:
+            yield labels
+        finally:
+            action = labels["action"] or "none"
+            REQUEST_DURATION.labels(view, action).observe(
+                time.perf_counter() - start
+            )
+            if count_queries:
+                REQUEST_QUERIES.labels(view, action).observe(counter.count)
+            REQUESTS.labels(view, action, labels["status"]).inc()
+
+
+class ViewMetricsMixin:
+    """Record metrics of every request handled by a viewset."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with observe_request(type(self).__name__) as labels:
+            response = super().dispatch(request, *args, **kwargs)
+            labels["action"] = self.action
+            labels["status"] = response.status_code
+        return response
+
+
+def render_metrics():
+    """Return the content and content type of the current metrics."""
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,36 +1,197 @@
 import time
-import base64
-from binascii import Error
+import cProfile
+import contextlib
+import logging
+import marshal
+import random
 
+from django.conf import settings
+from django.db import DatabaseError, connections
 from django.shortcuts import redirect
 from django.http import Http404
+from django.middleware import cache
+from django.utils.deprecation import MiddlewareMixin
 
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 
-class ExpiringLinkMiddleware:
-    """Middleware for handling expiring links."""
+from core.access import access_counter
+from core.links import decode_link, stored_file_name
+from core.metrics import CACHE_REQUESTS, EXPIRING_LINKS
+from core.models import RequestProfile
+from core.revocation import is_revoked
+from core.timing import QueryTimer, log_timings, request_timings, server_timing
+
+logger = logging.getLogger(__name__)
+
+# Seeded by the OS, so workers forked without reseeding sample differently
+system_random = random.SystemRandom()
 
-    def __init__(self, get_response):
-        self.get_response = get_response
 
-    def __call__(self, request):
+class ExpiringLinkMiddleware(MiddlewareMixin):
+    """Middleware for handling expiring links."""
+
+    def process_request(self, request):
         if request.GET.get("exp") == "1":
-            if link := self.decode_link(request):
-                return redirect(link)
+            if link := decode_link(request.path[1:]):
+                url, _, link_id = link
+                if is_revoked(link_id):
+                    EXPIRING_LINKS.labels("revoked").inc()
+                    raise Http404("Invalid or expired link.")
+                EXPIRING_LINKS.labels("redirect").inc()
+                access_counter.hit(link_id, stored_file_name(url) or url)
+                # Marks the file as linked for the proxy, which caches it as such
+                return redirect(f"{url}?link=1")
+            EXPIRING_LINKS.labels("invalid").inc()
             raise Http404("Invalid or expired link.")
 
-        response = self.get_response(request)
+
+class FetchFromCacheMiddleware(cache.FetchFromCacheMiddleware):
+    """Page cache middleware counting hits and misses."""
+
+    def process_request(self, request):
+        response = super().process_request(request)
+        if request.method in ("GET", "HEAD"):
+            CACHE_REQUESTS.labels("page", "hit" if response else "miss").inc()
         return response
 
-    def decode_link(self, request):
-        """URL decoding method."""
+
+class QueryLog:
+    """Database execute wrapper keeping the SQL and duration of queries."""
+
+    # Bounds the stored profile of requests running away with queries
+    max_queries = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
         try:
-            decrypted_path = base64.urlsafe_b64decode(
-                request.path[1:].encode("utf-8")
-            ).decode("utf-8")
-            expire_time_str = decrypted_path.split("=")[-1]
-            expire_time = int(expire_time_str)
-            if expire_time < time.time():
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            if len(self.queries) < self.max_queries:
+                # Parameters are left out, they may hold user data
+                self.queries.append(
+                    {
+                        "alias": context["connection"].alias,
+                        "sql": sql,
+                        "many": many,
+                        "duration_ms": (time.perf_counter() - start) * 1000,
+                    }
+                )
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """Profile sampled requests and store the profile with their queries.
+
+    PROFILING_SAMPLE_RATE of all requests is sampled, as well as requests of
+    staff users sending the PROFILING_HEADER. Other requests only pay for a
+    random number and a header lookup.
+    """
+
+    def process_request(self, request):
+        if not self.sampled(request):
+            return
+
+        profiler = cProfile.Profile()
+        queries = QueryLog()
+        stack = contextlib.ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running in this thread
+            stack.close()
+            return
+        request._profiling = (profiler, queries, stack, time.perf_counter())
+
+    def process_response(self, request, response):
+        profiling = getattr(request, "_profiling", None)
+        if profiling is None:
+            return response
+
+        profiler, queries, stack, start = profiling
+        profiler.disable()
+        duration = (time.perf_counter() - start) * 1000
+        stack.close()
+        del request._profiling
+        profiler.create_stats()
+
+        user = getattr(request, "user", None)
+        try:
+            profile = RequestProfile.objects.create(
+                user=user if user and user.is_authenticated else None,
+                method=request.method,
+                path=request.get_full_path()[:2048],
+                status_code=response.status_code,
+                duration_ms=duration,
+                query_count=queries.count,
+                queries=queries.queries,
+                stats=marshal.dumps(profiler.stats),
+            )
+        except DatabaseError:
+            logger.exception("Storing the profile of %s failed.", request.path)
+        else:
+            response["X-Profile-Id"] = profile.id
+        return response
+
+    def sampled(self, request):
+        """Return whether the request should be profiled."""
+
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and system_random.random() < rate:
+            return True
+        if settings.PROFILING_HEADER in request.META:
+            return self.is_staff(request)
+        return False
+
+    def is_staff(self, request):
+        """Return whether the session or token user is a staff member."""
+
+        user = request.user
+        if not user.is_authenticated:
+            try:
+                user, _ = TokenAuthentication().authenticate(request) or (user, None)
+            except AuthenticationFailed:
                 return False
-            return decrypted_path.split("?")[0]
-        except (UnicodeDecodeError, Error, ValueError):
-            return False
+        return user.is_staff
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """Report the time spent per stage of requests.
+
+    With SERVER_TIMING the stages are sent in a Server-Timing header, with
+    TIMING_LOG they are logged as JSON.
+    """
+
+    def process_request(self, request):
+        if not (settings.SERVER_TIMING or settings.TIMING_LOG):
+            return
+
+        timings = {}
+        stack = contextlib.ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(QueryTimer(timings)))
+        request_timings.set(timings)
+        request._timing = (timings, stack, time.perf_counter())
+
+    def process_response(self, request, response):
+        timing = getattr(request, "_timing", None)
+        if timing is None:
+            return response
+
+        timings, stack, start = timing
+        total = time.perf_counter() - start
+        stack.close()
+        request_timings.set(None)
+        del request._timing
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = server_timing(timings, total)
+        if settings.TIMING_LOG:
+            log_timings(request, response, timings, total)
+        return response
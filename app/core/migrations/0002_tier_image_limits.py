@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-19 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tier',
+            name='max_image_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tier',
+            name='max_image_pixels',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.1.13 on 2026-10-19 14:39
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_storage_usage(apps, schema_editor):
+    """Create usage counters of existing users from their stored files."""
+
+    User = apps.get_model('core', 'User')
+    Image = apps.get_model('core', 'Image')
+    Thumbnail = apps.get_model('core', 'Thumbnail')
+    StorageUsage = apps.get_model('core', 'StorageUsage')
+
+    StorageUsage.objects.bulk_create(
+        [StorageUsage(user_id=id) for id in User.objects.values_list('id', flat=True)]
+    )
+    images = Image.objects.filter(user=OuterRef('user')).order_by().values('user')
+    thumbnails = Thumbnail.objects.filter(user=OuterRef('user')).order_by().values('user')
+    StorageUsage.objects.update(
+        image_count=Coalesce(Subquery(images.annotate(count=Count('id')).values('count')), 0),
+        bytes_used=Coalesce(Subquery(images.annotate(size=Sum('file_size')).values('size')), 0)
+        + Coalesce(Subquery(thumbnails.annotate(size=Sum('file_size')).values('size')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_image_file_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('image_count', models.BigIntegerField(default=0)),
+                ('bytes_used', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tier',
+            name='max_images',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tier',
+            name='max_storage_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(count_storage_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_storage_quota'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tier',
+            name='rate_limits',
+            field=models.JSONField(blank=True, default=dict, help_text='Rates per endpoint overriding the defaults, e.g. {"upload": "10/minute"}. Use null for no limit.'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.13 on 2026-10-19 14:57
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built without locking writes, before the FK indexes they
+    # replace are dropped
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_tier_rate_limits'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='image',
+            index=models.Index(fields=['user', 'id'], name='image_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='thumbnail',
+            index=models.Index(fields=['user', 'id'], name='thumbnail_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='thumbnail',
+            index=models.Index(fields=['image', 'height'], name='thumbnail_image_height_idx'),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='thumbnail',
+            name='image',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.image'),
+        ),
+        migrations.AlterField(
+            model_name='thumbnail',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
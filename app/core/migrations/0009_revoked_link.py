@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_request_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedLink',
+            fields=[
+                ('link_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('expires', models.DateTimeField(db_index=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
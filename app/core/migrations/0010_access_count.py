@@ -0,0 +1,31 @@
+# Generated by Django 4.1.13 on 2026-10-19 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_revoked_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('link_id', models.CharField(max_length=32)),
+                ('file', models.CharField(max_length=255)),
+                ('hits', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='accesscount',
+            index=models.Index(fields=['file', 'day'], name='access_count_file_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='accesscount',
+            constraint=models.UniqueConstraint(fields=('day', 'link_id'), name='access_count_day_link_uniq'),
+        ),
+    ]
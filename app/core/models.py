@@ -2,12 +2,18 @@
 Database models.
 """
 
-import os
 import io
+import os
+import time
+import marshal
+import pstats
 import uuid
 import datetime
+from functools import partial
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import validate_image_file_extension
 from django.core.files import File
 from django.core.validators import MinValueValidator
@@ -19,7 +25,19 @@ from django.contrib.auth.models import (
 )
 from django.dispatch import receiver
 
-import PIL.Image
+from core.imaging import (
+    decode_image,
+    difference_hash,
+    dominant_color,
+    encode_blurhash,
+    file_digest,
+    placeholder_sample,
+    render_thumbnail,
+)
+from core.similarity import add_to_similarity_index, remove_from_similarity_index
+from core.metrics import IMAGE_DECODE_DURATION, THUMBNAIL_RENDER_DURATION
+from core.timing import timed
+from core.ratelimit import parse_rate
 
 
 def image_file_path(instance, filename):
@@ -107,6 +125,16 @@ class Tier(models.Model):
     thumbnails = models.BooleanField(default=True)
     original_size = models.BooleanField(default=False)
     expiring_link = models.BooleanField(default=False)
+    max_image_pixels = models.PositiveBigIntegerField(null=True, blank=True)
+    max_image_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    max_images = models.PositiveIntegerField(null=True, blank=True)
+    max_storage_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    rate_limits = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Rates per endpoint overriding the defaults, e.g. {"upload": '
+        '"10/minute"}. Use null for no limit.',
+    )
 
     def __str__(self):
         return self.name
@@ -114,6 +142,11 @@ class Tier(models.Model):
     def clean(self):
         if not self.name:
             raise ValidationError("Tier must have a name.")
+        if not isinstance(self.rate_limits, dict):
+            raise ValidationError("Rate limits must be a mapping of endpoints.")
+        for rate in self.rate_limits.values():
+            if rate is not None:
+                parse_rate(rate)
 
     def save(self, *args, **kwargs):
         self.full_clean()
@@ -153,10 +186,28 @@ class ThumbnailSize(models.Model):
 class Image(models.Model):
     """Image model."""
 
-    user = models.ForeignKey("User", on_delete=models.CASCADE)
+    # Indexed by (user, id) below
+    user = models.ForeignKey("User", on_delete=models.CASCADE, db_index=False)
     image = models.ImageField(
         upload_to=image_file_path, validators=[validate_image_file_extension]
     )
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True, db_index=True)
+    format = models.CharField(max_length=10, blank=True, db_index=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    exif = models.JSONField(default=dict, blank=True)
+    # Perceptual hash for near-duplicate search, see core.similarity
+    dhash = models.BigIntegerField(null=True, blank=True)
+    # Placeholders painted until a thumbnail loads
+    blurhash = models.CharField(max_length=32, blank=True)
+    dominant_color = models.CharField(max_length=7, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["width", "height"], name="image_dimensions_idx"),
+            models.Index(fields=["user", "id"], name="image_user_id_idx"),
+        ]
 
     def __str__(self):
         return self.image.path.split("/")[-1]
@@ -174,12 +225,25 @@ class Image(models.Model):
 class Thumbnail(models.Model):
     """Thumbnail model."""
 
-    user = models.ForeignKey("User", on_delete=models.CASCADE)
-    image = models.ForeignKey("Image", on_delete=models.CASCADE)
+    # Indexed by (user, id) and (image, height) below
+    user = models.ForeignKey("User", on_delete=models.CASCADE, db_index=False)
+    image = models.ForeignKey("Image", on_delete=models.CASCADE, db_index=False)
     height = models.ForeignKey("ThumbnailSize", on_delete=models.CASCADE)
     thumbnail = models.ImageField(
         upload_to=image_file_path, validators=[validate_image_file_extension]
     )
+    width = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    format = models.CharField(max_length=10, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="thumbnail_user_id_idx"),
+            models.Index(
+                fields=["image", "height"], name="thumbnail_image_height_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.thumbnail.path.split("/")[-1]
@@ -192,50 +256,226 @@ class Thumbnail(models.Model):
         return super(Thumbnail, self).delete(*args, **kwargs)
 
 
+class StorageUsageManager(models.Manager):
+    """Manager for storage usage counters."""
+
+    def track(self, user_id, images=0, size=0):
+        """Atomically adjust the usage counters of a user."""
+
+        self.filter(user_id=user_id).update(
+            image_count=F("image_count") + images,
+            bytes_used=F("bytes_used") + size,
+        )
+
+    def recount(self):
+        """Recalculate all usage counters from the stored files."""
+
+        users = User.objects.values_list("id", flat=True)
+        self.bulk_create(
+            [self.model(user_id=id) for id in users],
+            ignore_conflicts=True,
+        )
+        images = Image.objects.filter(user=OuterRef("user")).order_by().values("user")
+        thumbnails = Thumbnail.objects.filter(user=OuterRef("user")).order_by()
+        thumbnails = thumbnails.values("user")
+        self.update(
+            image_count=Coalesce(
+                Subquery(images.annotate(count=Count("id")).values("count")), 0
+            ),
+            bytes_used=Coalesce(
+                Subquery(images.annotate(size=Sum("file_size")).values("size")), 0
+            )
+            + Coalesce(
+                Subquery(thumbnails.annotate(size=Sum("file_size")).values("size")), 0
+            ),
+        )
+
+
+class StorageUsage(models.Model):
+    """Storage used by a user, kept up to date on upload and delete."""
+
+    user = models.OneToOneField("User", on_delete=models.CASCADE, primary_key=True)
+    image_count = models.BigIntegerField(default=0)
+    bytes_used = models.BigIntegerField(default=0)
+
+    objects = StorageUsageManager()
+
+    def __str__(self):
+        return f"{self.user} - {self.image_count} images, {self.bytes_used} bytes"
+
+
+class RequestProfile(models.Model):
+    """Profile and SQL queries of a sampled request."""
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(
+        "User", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    queries = models.JSONField(default=list, blank=True)
+    # Marshalled cProfile stats, the format of pstats dump files
+    stats = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.method} {self.path} - {self.duration_ms:.0f} ms"
+
+    def stats_summary(self, limit=40):
+        """Return the functions with the highest cumulative time as text."""
+
+        output = io.StringIO()
+        stats = pstats.Stats(_StoredStats(self.stats), stream=output)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+
+class RevokedLink(models.Model):
+    """Expiring link revoked before it expires, kept until it expires."""
+
+    # Id signed into the link, see core.links
+    link_id = models.CharField(max_length=32, primary_key=True)
+    user = models.ForeignKey("User", on_delete=models.CASCADE)
+    expires = models.DateTimeField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.link_id} (expires {self.expires:%Y-%m-%d %H:%M})"
+
+
+class AccessCount(models.Model):
+    """Hits of an expiring link in a day, added up by core.access."""
+
+    day = models.DateField()
+    link_id = models.CharField(max_length=32)
+    # Storage name of the linked image or thumbnail
+    file = models.CharField(max_length=255)
+    hits = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "link_id"], name="access_count_day_link_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["file", "day"], name="access_count_file_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.file} {self.day}: {self.hits}"
+
+
+class _StoredStats:
+    """Stored profile in the form pstats.Stats loads profilers from."""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(bytes(data))
+
+    def create_stats(self):
+        pass
+
+
+@receiver(models.signals.post_save, sender=User)
+def user_storage_usage_creation(sender, instance, created, **kwargs):
+    """Automatic creation of usage counters for new users."""
+
+    if created:
+        StorageUsage.objects.create(user=instance)
+
+
+@receiver(models.signals.post_delete, sender=Image)
+def image_storage_usage_release(sender, instance, **kwargs):
+    """Release the storage of a deleted image."""
+
+    StorageUsage.objects.track(
+        instance.user_id, images=-1, size=-(instance.file_size or 0)
+    )
+
+
+@receiver(models.signals.post_delete, sender=Image)
+def image_similarity_removal(sender, instance, **kwargs):
+    """Remove a deleted image from the near-duplicate search."""
+
+    if instance.dhash is not None:
+        transaction.on_commit(
+            partial(remove_from_similarity_index, instance.user_id, instance.id)
+        )
+
+
+@receiver(models.signals.post_delete, sender=Thumbnail)
+def thumbnail_storage_usage_release(sender, instance, **kwargs):
+    """Release the storage of a deleted thumbnail."""
+
+    StorageUsage.objects.track(instance.user_id, size=-(instance.file_size or 0))
+
+
 @receiver(models.signals.post_save, sender=Image)
 def image_filename_completion(sender, instance, created, **kwargs):
     """Automatic generation of thumbnails."""
 
     # Checking that an image instance has been created
-    if created:
-        # Creating a list of available heights
-        if instance.user.is_superuser or instance.user.is_staff:
-            height_list = ThumbnailSize.objects.values_list(
-                "height",
-                flat=True,
-            ).distinct()
-        elif instance.user.tier.thumbnails:
-            height_list = ThumbnailSize.objects.filter(
-                tier=instance.user.tier,
-            ).values_list(
-                "height",
-                flat=True,
-            )
-        # Generating thumbnails with Pillow library
-        if height_list:
-            ext = instance.image.path.split(".")[-1]
-            with open(instance.image.path, "rb") as file:
-                image_file = File(file)
-                for height in height_list:
-                    if instance.user.tier:
-                        thumbnail_size_obj = ThumbnailSize.objects.get(
-                            tier=instance.user.tier,
-                            height=height,
-                        )
-                    else:
-                        thumbnail_size_obj = ThumbnailSize.objects.filter(
-                            height=height,
-                        ).last()
-                    img = PIL.Image.open(image_file)
-                    format = img.format
-                    original_width, original_height = img.size
-                    ratio = original_height / height
-                    width = int(original_width / ratio)
-                    resized_img = img.resize((width, height))
-                    temp_file = io.BytesIO()
-                    resized_img.save(temp_file, format=format)
-                    resized_img.seek(0)
-                    thumbnail = Thumbnail(
-                        user=instance.user, height=thumbnail_size_obj, image=instance
-                    )
-                    thumbnail.thumbnail.save(f"temp_filename.{ext}", File(temp_file))
+    if not created:
+        return
+
+    # Creating a list of available thumbnail sizes, one per height
+    if instance.user.is_superuser or instance.user.is_staff:
+        sizes = ThumbnailSize.objects.order_by("height", "-id").distinct("height")
+    elif instance.user.tier.thumbnails:
+        sizes = ThumbnailSize.objects.filter(tier=instance.user.tier)
+    else:
+        sizes = ThumbnailSize.objects.none()
+
+    # Decoding the image once, its metadata and all thumbnails come from it
+    with instance.image.open("rb") as file:
+        instance.content_hash = file_digest(file)
+        start = time.perf_counter()
+        with timed("decode"):
+            decoded = decode_image(file)
+    IMAGE_DECODE_DURATION.labels(decoded.format).observe(time.perf_counter() - start)
+    instance.width = decoded.width
+    instance.height = decoded.height
+    instance.file_size = instance.image.size
+    instance.format = decoded.format
+    instance.exif = decoded.exif
+    sample = placeholder_sample(decoded.image)
+    instance.dhash = difference_hash(sample)
+    instance.blurhash = encode_blurhash(sample)
+    instance.dominant_color = dominant_color(sample)
+    Image.objects.filter(pk=instance.pk).update(
+        width=instance.width,
+        height=instance.height,
+        file_size=instance.file_size,
+        format=instance.format,
+        content_hash=instance.content_hash,
+        exif=instance.exif,
+        dhash=instance.dhash,
+        blurhash=instance.blurhash,
+        dominant_color=instance.dominant_color,
+    )
+    transaction.on_commit(
+        partial(add_to_similarity_index, instance.user_id, instance.id, instance.dhash)
+    )
+
+    # Generating thumbnails with Pillow library
+    ext = instance.image.path.split(".")[-1]
+    used_bytes = instance.file_size
+    for size in sizes:
+        with THUMBNAIL_RENDER_DURATION.labels(decoded.format).time():
+            with timed("thumbnail"):
+                width, thumbnail_file = render_thumbnail(decoded, size.height)
+        thumbnail = Thumbnail(
+            user=instance.user,
+            height=size,
+            image=instance,
+            width=width,
+            file_size=thumbnail_file.getbuffer().nbytes,
+            format=decoded.format,
+            content_hash=file_digest(thumbnail_file),
+        )
+        thumbnail.thumbnail.save(f"temp_filename.{ext}", File(thumbnail_file))
+        used_bytes += thumbnail.file_size
+
+    StorageUsage.objects.track(instance.user_id, images=1, size=used_bytes)
@@ -0,0 +1,36 @@
+"""
+Preloading of the app before server workers are forked.
+
+Django imports the URLconf, and with it every view and serializer, on the
+first request, and Pillow imports its format plugins on the first upload.
+Done in the uWSGI master or the gunicorn arbiter instead, the workers fork
+with everything loaded and share the memory copy-on-write.
+"""
+
+import gc
+
+import PIL.Image
+
+from django.db import connections
+from django.urls import get_resolver
+
+from core.access import flush_in_background
+
+
+def preload_app():
+    """Load what Django and Pillow load lazily and prepare for forking.
+
+    Workers inherit the setup flushing their link hits in the background.
+    """
+
+    get_resolver().url_patterns
+    PIL.Image.init()
+    flush_in_background()
+
+    # Connections must not be shared by the forked workers
+    connections.close_all()
+
+    # Objects loaded so far live as long as the workers, with the garbage
+    # collector ignoring them it does not write to their shared pages
+    gc.collect()
+    gc.freeze()
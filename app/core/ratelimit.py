@@ -0,0 +1,94 @@
+"""
+Token bucket rate limiting on top of a shared cache.
+"""
+
+import math
+import time
+from dataclasses import dataclass
+
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+MICROSECONDS = 1_000_000
+
+
+def parse_rate(rate):
+    """Parse a "<requests>/<period>" rate, e.g. "10/minute", into a tuple."""
+
+    try:
+        num, period = rate.split("/")
+        num = int(num)
+        duration = PERIODS[period.strip()[0]]
+    except (AttributeError, ValueError, KeyError, IndexError):
+        raise ValidationError(f"Invalid rate: {rate!r}.")
+    if num < 1:
+        raise ValidationError(f"Invalid rate: {rate!r}.")
+
+    return num, duration
+
+
+@dataclass
+class BucketState:
+    """State of a bucket after a request."""
+
+    allowed: bool
+    limit: int
+    period: int
+    remaining: int
+    reset: int
+    retry_after: int = 0
+
+
+class TokenBucket:
+    """A token bucket of `limit` tokens refilled evenly over `period` seconds.
+
+    The bucket is stored as the time at which it will be full again (GCRA),
+    so taking a token is a single atomic increment of one cache key and no
+    read-modify-write cycle is needed.
+    """
+
+    key_timeout = 60 * 60 * 24
+
+    def __init__(self, limit, period, cache_alias="shared"):
+        self.limit = limit
+        self.period = period
+        self.cache_alias = cache_alias
+        self.interval = max(1, period * MICROSECONDS // limit)
+        self.capacity = self.interval * limit
+
+    def consume(self, key):
+        """Take a token for the key and return the state of its bucket."""
+
+        cache = caches[self.cache_alias]
+        now = int(time.time() * MICROSECONDS)
+        try:
+            full_at = cache.incr(key, self.interval)
+        except ValueError:
+            full_at = None
+        # A missing or drained bucket restarts from now, racing requests can
+        # only make it a single token more generous
+        if full_at is None or full_at < now + self.interval:
+            full_at = now + self.interval
+            cache.set(key, full_at, self.key_timeout)
+
+        if full_at - now > self.capacity:
+            full_at = cache.decr(key, self.interval)
+            return BucketState(
+                allowed=False,
+                limit=self.limit,
+                period=self.period,
+                remaining=0,
+                reset=math.ceil((full_at - now) / MICROSECONDS),
+                retry_after=math.ceil(
+                    (full_at + self.interval - self.capacity - now) / MICROSECONDS
+                ),
+            )
+
+        return BucketState(
+            allowed=True,
+            limit=self.limit,
+            period=self.period,
+            remaining=(self.capacity - (full_at - now)) // self.interval,
+            reset=math.ceil((full_at - now) / MICROSECONDS),
+        )
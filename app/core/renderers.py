@@ -0,0 +1,22 @@
+"""
+Compact renderers for API responses.
+"""
+
+import msgpack
+
+from rest_framework.renderers import BaseRenderer
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render responses as MessagePack for clients accepting it."""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Dates, decimals and UUIDs are sent as strings, as in JSON
+        return msgpack.packb(data, default=str)
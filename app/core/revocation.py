@@ -0,0 +1,169 @@
+"""
+Revocation of expiring links.
+
+Revoked links are kept in the RevokedLink table by the id signed into them
+until they expire. A Bloom filter of their ids lives in the shared cache
+and every worker keeps a copy of it, refreshed when the version in the
+cache changes. Verifying a link that was never revoked costs a version
+lookup in the cache and a few bit tests. Links found in the filter are
+confirmed against the table, so a false positive costs a query but never
+blocks a link. Without a filter, after a cache restart or while the cache
+is unreachable, links are looked up in the table until one worker rebuilt
+the filter.
+"""
+
+import datetime
+import hashlib
+import logging
+import math
+import uuid
+
+from redis.exceptions import RedisError
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import RevokedLink
+
+logger = logging.getLogger(__name__)
+
+FILTER_KEY = "link-revocations:filter"
+VERSION_KEY = "link-revocations:version"
+# Held by the worker rebuilding a missing filter, for at most REBUILD_TIMEOUT
+REBUILD_KEY = "link-revocations:rebuilding"
+REBUILD_TIMEOUT = 30
+
+# Serializes rebuilds, so the last filter written holds every revoked link
+REBUILD_LOCK_ID = 0x11AB10C
+
+# Version and filter of this process
+_current = (None, None)
+
+
+class BloomFilter:
+    """Set of strings answering "maybe present" or "surely absent"."""
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits or (size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        """Return a filter holding `capacity` keys at the false positive rate."""
+
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return cls(size, hashes)
+
+    def positions(self, key):
+        # Double hashing derives all positions from one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(key)
+        )
+
+
+def rebuild_filter():
+    """Build the filter from the table and store it in the shared cache."""
+
+    global _current
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [REBUILD_LOCK_ID])
+        ids = list(
+            RevokedLink.objects.filter(expires__gt=timezone.now()).values_list(
+                "link_id", flat=True
+            )
+        )
+
+        revoked = BloomFilter.for_capacity(
+            max(settings.LINK_REVOCATION_CAPACITY, len(ids)),
+            settings.LINK_REVOCATION_ERROR_RATE,
+        )
+        for id in ids:
+            revoked.add(id)
+
+        version = uuid.uuid4().hex
+        cache = caches["shared"]
+        cache.set(
+            FILTER_KEY,
+            (version, revoked.size, revoked.hashes, bytes(revoked.bits)),
+            timeout=None,
+        )
+        cache.set(VERSION_KEY, version, timeout=None)
+
+    _current = (version, revoked)
+    return revoked
+
+
+def revocation_filter():
+    """Return the current filter or None if there is none to trust.
+
+    Loads the filter when another worker changed it. When it is missing one
+    worker at a time rebuilds it, the others get None meanwhile.
+    """
+
+    global _current
+
+    cache = caches["shared"]
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is not None and version == _current[0]:
+            return _current[1]
+
+        stored = cache.get(FILTER_KEY)
+        if version is not None and stored is not None and stored[0] == version:
+            _current = (version, BloomFilter(*stored[1:]))
+            return _current[1]
+
+        if not cache.add(REBUILD_KEY, 1, timeout=REBUILD_TIMEOUT):
+            return None
+        try:
+            return rebuild_filter()
+        finally:
+            cache.delete(REBUILD_KEY)
+    except RedisError:
+        logger.warning("Revocation filter unavailable.", exc_info=True)
+        return None
+
+
+def is_revoked(link_id):
+    """Return whether the link with the id was revoked."""
+
+    revoked = revocation_filter()
+    if revoked is not None and link_id not in revoked:
+        return False
+    return RevokedLink.objects.filter(link_id=link_id).exists()
+
+
+def revoke_link(user, link_id, expires):
+    """Revoke the link with the id until its expires timestamp.
+
+    Revocations of links that expired since are deleted on the way.
+    """
+
+    RevokedLink.objects.filter(expires__lte=timezone.now()).delete()
+    RevokedLink.objects.get_or_create(
+        link_id=link_id,
+        defaults={
+            "user": user,
+            "expires": datetime.datetime.fromtimestamp(
+                expires, tz=datetime.timezone.utc
+            ),
+        },
+    )
+    transaction.on_commit(rebuild_filter)
@@ -0,0 +1,229 @@
+"""
+Near-duplicate search of images by their perceptual hash.
+
+The dHashes of the images of a user are split in CHUNKS parts and held
+in one hash table per part (multi-index hashing). A hash within r bits
+of the searched one differs in at most r // CHUNKS bits of one of its
+parts, so a search only looks up the buckets within that many bits of
+each part of the searched hash and computes the distance to the hashes
+found there. At the default distance that is under 1% of random hashes,
+see benchmarks/similarity.py. Searches that would probe more buckets
+than there are hashes check every hash instead. Every worker keeps the
+indexes of recently searched users. Uploads append their hash to a list
+of the user's index version in the shared cache, which workers add to
+their indexes on the next search. Deletions are logged the same way.
+Indexes are built from the database only when a worker has none or the
+version was reset.
+"""
+
+import collections
+import functools
+import itertools
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.imaging import hamming_distance
+
+# Differing bits of the 64 bit hashes searched by default and at most
+DEFAULT_DISTANCE = 10
+MAX_DISTANCE = 32
+# Most near-duplicates returned by a search
+MAX_RESULTS = 100
+# Seconds uploads stay in the shared cache, workers missing one rebuild
+ADDED_TIMEOUT = 86400
+# Hashes are indexed by each of their parts of CHUNK_BITS bits
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def index_key(user_id):
+    return f"similarity-index:{user_id}"
+
+
+def added_key(user_id, version, number=None):
+    key = f"similarity-index:{user_id}:{version}:added"
+    return key if number is None else f"{key}:{number}"
+
+
+def hash_chunks(value):
+    """Return the CHUNKS parts of CHUNK_BITS bits of a 64-bit hash."""
+
+    value &= 0xFFFFFFFFFFFFFFFF
+    return [(value >> shift) & CHUNK_MASK for shift in range(0, 64, CHUNK_BITS)]
+
+
+@functools.lru_cache(maxsize=None)
+def flip_masks(radius):
+    """Return the masks flipping up to radius bits of a chunk."""
+
+    return tuple(
+        sum(1 << position for position in positions)
+        for bits in range(radius + 1)
+        for positions in itertools.combinations(range(CHUNK_BITS), bits)
+    )
+
+
+class MultiIndexHash:
+    """Hashes indexed by each of their chunks, searched by Hamming distance."""
+
+    def __init__(self):
+        self.hashes = {}
+        # A table per chunk of the ids of the hashes by the value of the chunk
+        self.tables = [{} for _ in range(CHUNKS)]
+
+    @property
+    def size(self):
+        return len(self.hashes)
+
+    def add(self, value, id):
+        # Uploads may also be in the database the index was built from
+        self.discard(id)
+        self.hashes[id] = value
+        for table, chunk in zip(self.tables, hash_chunks(value)):
+            table.setdefault(chunk, set()).add(id)
+
+    def discard(self, id):
+        value = self.hashes.pop(id, None)
+        if value is None:
+            return
+        for table, chunk in zip(self.tables, hash_chunks(value)):
+            table[chunk].discard(id)
+            if not table[chunk]:
+                del table[chunk]
+
+    def candidates(self, value, max_distance):
+        """Return the ids of the hashes which may lie within max_distance."""
+
+        # A hash within max_distance differs from the searched one in at
+        # most max_distance // CHUNKS bits of at least one of its chunks
+        masks = flip_masks(max_distance // CHUNKS)
+        # Wide searches would probe more buckets than there are hashes
+        if len(masks) * CHUNKS >= len(self.hashes):
+            return self.hashes.keys()
+
+        found = set()
+        for table, chunk in zip(self.tables, hash_chunks(value)):
+            for mask in masks:
+                ids = table.get(chunk ^ mask)
+                if ids:
+                    found |= ids
+        return found
+
+    def search(self, value, max_distance):
+        """Return (distance, id) of the hashes within max_distance."""
+
+        found = []
+        for id in self.candidates(value, max_distance):
+            distance = hamming_distance(value, self.hashes[id])
+            if distance <= max_distance:
+                found.append((distance, id))
+        return sorted(found)
+
+
+# Version, uploads added and index of this process by user id, least
+# recently used first
+_indexes = collections.OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def invalidate_similarity_index(user_id):
+    """Make workers rebuild the index of the user on the next search."""
+
+    caches["shared"].set(index_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def log_change(user_id, dhash, id):
+    """Make workers apply a change of an image to the index of the user."""
+
+    cache = caches["shared"]
+    version = cache.get(index_key(user_id))
+    # Without a version the index is built from the database on first search
+    if version is None:
+        return
+    cache.add(added_key(user_id, version), 0, timeout=None)
+    number = cache.incr(added_key(user_id, version))
+    cache.set(added_key(user_id, version, number), (dhash, id), ADDED_TIMEOUT)
+
+
+def add_to_similarity_index(user_id, id, dhash):
+    """Make workers add an uploaded image to the index of the user."""
+
+    log_change(user_id, dhash, id)
+
+
+def remove_from_similarity_index(user_id, id):
+    """Make workers remove a deleted image from the index of the user."""
+
+    # Logged without a hash, workers discard the id
+    log_change(user_id, None, id)
+
+
+def current_version(user_id):
+    """Return the version of the index of the user and its number of uploads."""
+
+    cache = caches["shared"]
+    version = cache.get(index_key(user_id))
+    if version is None:
+        cache.add(index_key(user_id), uuid.uuid4().hex, timeout=None)
+        version = cache.get(index_key(user_id))
+    return version, cache.get(added_key(user_id, version), 0)
+
+
+def similarity_index(user_id):
+    """Return the multi-index hash of the hashed images of the user."""
+
+    # core.models imports this module
+    from core.models import Image
+
+    version, added = current_version(user_id)
+    with _indexes_lock:
+        cached = _indexes.get(user_id)
+    if cached is not None and cached[0] == version:
+        _, applied, index = cached
+        if applied == added:
+            with _indexes_lock:
+                _indexes.move_to_end(user_id)
+            return index
+
+        keys = [
+            added_key(user_id, version, number)
+            for number in range(applied + 1, added + 1)
+        ]
+        changes = caches["shared"].get_many(keys)
+        # Changes gone from the cache are read from the database instead
+        if len(changes) == len(keys):
+            with _indexes_lock:
+                for key in keys:
+                    dhash, id = changes[key]
+                    if dhash is None:
+                        index.discard(id)
+                    else:
+                        index.add(dhash, id)
+                _indexes[user_id] = (version, added, index)
+                _indexes.move_to_end(user_id)
+            return index
+
+    index = MultiIndexHash()
+    images = Image.objects.filter(user_id=user_id, dhash__isnull=False)
+    for id, dhash in images.values_list("id", "dhash").order_by("id"):
+        index.add(dhash, id)
+
+    with _indexes_lock:
+        _indexes[user_id] = (version, added, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.SIMILARITY_INDEX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def similar_images(user_id, dhash, max_distance):
+    """Return (distance, id) of the user's images near the hash, closest first."""
+
+    index = similarity_index(user_id)
+    # Other threads of the worker may apply changes to the index meanwhile
+    with _indexes_lock:
+        return index.search(dhash, max_distance)
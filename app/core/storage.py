@@ -0,0 +1,31 @@
+"""
+File storage of uploaded images and thumbnails.
+"""
+
+from django.core.files.storage import FileSystemStorage
+
+from core.timing import timed
+
+
+class TimedFileSystemStorage(FileSystemStorage):
+    """File system storage adding file operations to the "storage" stage."""
+
+    @timed("storage")
+    def _open(self, name, mode="rb"):
+        return super()._open(name, mode)
+
+    @timed("storage")
+    def _save(self, name, content):
+        return super()._save(name, content)
+
+    @timed("storage")
+    def delete(self, name):
+        return super().delete(name)
+
+    @timed("storage")
+    def exists(self, name):
+        return super().exists(name)
+
+    @timed("storage")
+    def size(self, name):
+        return super().size(name)
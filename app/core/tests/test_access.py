@@ -0,0 +1,114 @@
+"""
+Tests for counting hits of expiring links.
+"""
+
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import models
+from core.access import AccessCounter, access_counter
+from core.links import encode_link
+
+
+@override_settings(ACCESS_FLUSH_SECONDS=3600, ACCESS_FLUSH_MAX_KEYS=1000)
+class AccessCounterTests(TestCase):
+    """Tests for adding up hits and flushing them."""
+
+    def setUp(self):
+        self.counter = AccessCounter()
+
+    def test_hits_flushed_in_one_query(self):
+        """Test pending hits are written with one upsert adding to the rows."""
+
+        for _ in range(3):
+            self.counter.hit("a" * 32, "uploads/a.jpg")
+        self.counter.hit("b" * 32, "uploads/b.jpg")
+
+        self.assertFalse(models.AccessCount.objects.exists())
+        with self.assertNumQueries(1):
+            self.counter.flush()
+        self.counter.hit("a" * 32, "uploads/a.jpg")
+        self.counter.flush()
+
+        counts = dict(models.AccessCount.objects.values_list("file", "hits"))
+        self.assertEqual(counts, {"uploads/a.jpg": 4, "uploads/b.jpg": 1})
+
+    def test_hits_flushed_in_key_order(self):
+        """Test rows are upserted in one order whatever order links were hit."""
+
+        for link_id in ("c", "a", "b"):
+            self.counter.hit(link_id * 32, f"uploads/{link_id}.jpg")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.counter.flush()
+
+        sql = queries[0]["sql"]
+        positions = [sql.index(link_id * 32) for link_id in ("a", "b", "c")]
+        self.assertEqual(positions, sorted(positions))
+
+    @override_settings(ACCESS_FLUSH_MAX_KEYS=2)
+    @patch("core.access.threading.Thread")
+    def test_many_links_wake_flusher(self, patched_thread):
+        """Test hits only start and wake the flushing thread of the worker."""
+
+        self.counter.background = True
+
+        with self.assertNumQueries(0):
+            self.counter.hit("a" * 32, "uploads/a.jpg")
+            self.assertFalse(self.counter.wake.is_set())
+            self.counter.hit("b" * 32, "uploads/b.jpg")
+
+        self.assertTrue(self.counter.wake.is_set())
+        patched_thread.assert_called_once()
+        patched_thread.return_value.start.assert_called_once()
+
+    @patch("core.access.close_old_connections")
+    def test_flusher_flushes_when_woken(self, patched_close):
+        """Test the flushing thread writes pending hits each time it wakes."""
+
+        self.counter.hit("a" * 32, "uploads/a.jpg")
+        # Stops the endless loop of the thread after one flush
+        with patch.object(self.counter.wake, "wait", side_effect=[True, SystemExit]):
+            with self.assertRaises(SystemExit):
+                self.counter.flush_periodically()
+
+        self.assertEqual(models.AccessCount.objects.get().hits, 1)
+        patched_close.assert_called_once()
+
+    def test_link_hits_counted(self):
+        """Test redirects of expiring links are counted per link."""
+
+        caches["shared"].clear()
+        access_counter.pending.clear()
+        path = encode_link("/static/media/uploads/a.jpg", int(time.time()) + 500)
+
+        for _ in range(2):
+            response = Client().get(f"/{path}?exp=1")
+            self.assertEqual(response.status_code, 302)
+        access_counter.flush()
+
+        count = models.AccessCount.objects.get()
+        self.assertEqual((count.file, count.hits), ("uploads/a.jpg", 2))
+
+    def test_admin_lists_counts(self):
+        """Test the counts are listed in the admin."""
+
+        self.counter.hit("a" * 32, "uploads/a.jpg")
+        self.counter.flush()
+        client = Client()
+        client.force_login(
+            get_user_model().objects.create_superuser(
+                username="admin", password="test1234"
+            )
+        )
+
+        response = client.get(reverse("admin:core_accesscount_changelist"))
+
+        self.assertContains(response, "uploads/a.jpg")
@@ -2,31 +2,41 @@
 Test custom Django management commands.
 """
 
+import io
+import os
+import shutil
+import tempfile
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2OpError
 
-from django.core.management import call_command
+import PIL.Image
+
+from django.core.management import call_command, CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase, TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.contrib.auth import get_user_model
 
-from core.models import Tier, ThumbnailSize
+from core.models import Tier, ThumbnailSize, Image, Thumbnail
 
 
+@patch("core.management.commands.wait_for_db.connections")
 @patch("core.management.commands.wait_for_db.Command.check")
 class CommandTests(SimpleTestCase):
     """Test commands without model manipulations."""
 
-    def test_wait_for_db_ready(self, patched_check):
+    def test_wait_for_db_ready(self, patched_check, patched_connections):
         """Test waiting for database if database is ready."""
         patched_check.return_value = True
 
         call_command("wait_for_db")
 
         patched_check.assert_called_once_with(databases=["default"])
+        patched_connections["default"].ensure_connection.assert_called_once()
 
     @patch("time.sleep")
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    def test_wait_for_db_delay(
+        self, patched_sleep, patched_check, patched_connections
+    ):
         """Test waiting for database when getting OperationalError."""
         patched_check.side_effect = (
             [Psycopg2OpError] * 2 + [OperationalError] * 3 + [True]
@@ -37,6 +47,32 @@ class CommandTests(SimpleTestCase):
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
 
+    @patch("time.sleep")
+    def test_wait_for_db_connection_refused(
+        self, patched_sleep, patched_check, patched_connections
+    ):
+        """Test waiting for database when the connection is refused."""
+        patched_connections["default"].ensure_connection.side_effect = (
+            [OperationalError] * 2 + [None]
+        )
+
+        call_command("wait_for_db")
+
+        self.assertEqual(patched_check.call_count, 3)
+
+    @patch("time.sleep")
+    def test_wait_for_db_timeout(
+        self, patched_sleep, patched_check, patched_connections
+    ):
+        """Test readiness check failing when the database is unavailable."""
+        patched_check.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command("wait_for_db", timeout=0)
+
+        patched_check.assert_called_once_with(databases=["default"])
+        patched_sleep.assert_not_called()
+
 
 class CommandDatabaseTests(TestCase):
     """Test commands with model manipulations."""
@@ -52,3 +88,86 @@ class CommandDatabaseTests(TestCase):
         self.assertEqual(len(users), 1)
         self.assertEqual(len(tiers), 3)
         self.assertEqual(len(thumbs), 5)
+
+    def test_backfill_image_metadata(self):
+        """Test filling in metadata of images uploaded without it."""
+
+        tier = Tier.objects.create(name="test")
+        ThumbnailSize.objects.create(tier=tier, height=5)
+        user = get_user_model().objects.create_user(
+            username="user",
+            password="test1234",
+            tier=tier,
+        )
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            PIL.Image.new("RGB", (20, 10)).save(image_file, format="JPEG")
+            image_file.seek(0)
+            image = Image(user=user)
+            image.image.save("temp_filename.jpg", image_file)
+        self.addCleanup(image.delete)
+        expected_hash = Image.objects.get(id=image.id).content_hash
+        Image.objects.update(width=None, height=None, file_size=None, content_hash="")
+        Thumbnail.objects.update(width=None, file_size=None, content_hash="")
+
+        call_command("backfill_image_metadata")
+        image.refresh_from_db()
+        thumbnail = Thumbnail.objects.get(image=image)
+
+        self.assertEqual((image.width, image.height), (20, 10))
+        self.assertEqual(image.file_size, image.image.size)
+        self.assertEqual(image.content_hash, expected_hash)
+        self.assertEqual(thumbnail.width, 10)
+        self.assertEqual(thumbnail.file_size, thumbnail.thumbnail.size)
+        self.assertEqual(len(thumbnail.content_hash), 64)
+
+    def test_backfill_image_hashes(self):
+        """Test hashing images uploaded without a hash or placeholders."""
+
+        tier = Tier.objects.create(name="test")
+        user = get_user_model().objects.create_user(
+            username="user",
+            password="test1234",
+            tier=tier,
+        )
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            PIL.Image.linear_gradient("L").save(image_file, format="JPEG")
+            image_file.seek(0)
+            image = Image(user=user)
+            image.image.save("temp_filename.jpg", image_file)
+        self.addCleanup(image.delete)
+        expected = Image.objects.values_list(
+            "dhash", "blurhash", "dominant_color"
+        ).get(id=image.id)
+        Image.objects.update(dhash=None, blurhash="", dominant_color="")
+
+        out = io.StringIO()
+        call_command("backfill_image_hashes", stdout=out)
+        image.refresh_from_db()
+
+        self.assertNotIn(None, expected)
+        self.assertEqual((image.dhash, image.blurhash, image.dominant_color), expected)
+        self.assertIn("Hashed 1 images.", out.getvalue())
+
+        Image.objects.update(dhash=0)
+        call_command("backfill_image_hashes", stdout=out)
+        call_command("backfill_image_hashes", "--all", stdout=out)
+        image.refresh_from_db()
+
+        self.assertEqual(image.dhash, expected[0])
+        self.assertIn("Hashed 0 images.", out.getvalue())
+
+    def test_startup_skips_current_steps(self):
+        """Test startup only runs the setup steps that are not current."""
+
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        with override_settings(STATIC_ROOT=static_root):
+            first, second = io.StringIO(), io.StringIO()
+            call_command("startup", stdout=first)
+            call_command("startup", stdout=second)
+
+        self.assertTrue(os.path.exists(os.path.join(static_root, "admin")))
+        self.assertIn("static files copied", first.getvalue())
+        self.assertIn("Migrations are up to date.", first.getvalue())
+        self.assertIn("Static files are up to date.", second.getvalue())
+        self.assertEqual(Tier.objects.count(), 3)
@@ -0,0 +1,147 @@
+"""
+Tests for the pooled PostgreSQL backend and the replica router.
+"""
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.db.postgresql_pool.base import DatabaseWrapper, pools
+from core.db.routers import (
+    ReplicaRouter,
+    pin_to_primary,
+    read_from_replica,
+    replica_reads_allowed,
+)
+
+
+class ConnectionPoolTests(TestCase):
+    """Tests for reusing connections through the pool."""
+
+    def create_wrapper(self, pool_size=2):
+        alias = f"pooled-{self.id()}"
+        settings_dict = {**connection.settings_dict, "POOL_SIZE": pool_size}
+        wrapper = DatabaseWrapper(settings_dict, alias)
+        self.addCleanup(pools.pop, alias, None)
+        self.addCleanup(lambda: alias in pools and pools[alias].clear())
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_closed_connection_is_reused(self):
+        """Test a closed connection is handed to the next wrapper."""
+
+        first = self.create_wrapper()
+        first.ensure_connection()
+        raw_connection = first.connection
+        first.close()
+
+        second = DatabaseWrapper(first.settings_dict, first.alias)
+        second.ensure_connection()
+
+        self.assertIs(second.connection, raw_connection)
+        second.close()
+
+    def test_connection_returned_in_transaction_is_rolled_back(self):
+        """Test an open transaction is rolled back before pooling."""
+
+        wrapper = self.create_wrapper()
+        wrapper.ensure_connection()
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        raw_connection = wrapper.connection
+        wrapper.close()
+
+        self.assertEqual(pools[wrapper.alias].idle, [raw_connection])
+        self.assertEqual(raw_connection.info.transaction_status, 0)
+
+    def test_broken_connection_is_not_reused(self):
+        """Test a connection closed while idle is dropped from the pool."""
+
+        wrapper = self.create_wrapper()
+        wrapper.ensure_connection()
+        raw_connection = wrapper.connection
+        wrapper.close()
+        raw_connection.close()
+
+        wrapper.ensure_connection()
+
+        self.assertIsNot(wrapper.connection, raw_connection)
+        self.assertEqual(pools[wrapper.alias].idle, [])
+
+    def test_connections_over_pool_size_are_closed(self):
+        """Test connections returned to a full pool are closed."""
+
+        first = self.create_wrapper(pool_size=1)
+        second = DatabaseWrapper(first.settings_dict, first.alias)
+        first.ensure_connection()
+        second.ensure_connection()
+        raw_connection = second.connection
+
+        first.close()
+        second.close()
+
+        self.assertEqual(len(pools[first.alias].idle), 1)
+        self.assertTrue(raw_connection.closed)
+
+    def test_connection_dropped_by_server_is_not_reused(self):
+        """Test the health check drops connections terminated by the server."""
+
+        wrapper = self.create_wrapper()
+        wrapper.ensure_connection()
+        raw_connection = wrapper.connection
+        backend_pid = raw_connection.get_backend_pid()
+        wrapper.close()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s)", [backend_pid])
+
+        wrapper.ensure_connection()
+
+        self.assertIsNot(wrapper.connection, raw_connection)
+        self.assertTrue(raw_connection.closed)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"])
+class ReplicaRouterTests(SimpleTestCase):
+    """Tests for routing reads to replicas."""
+
+    def setUp(self):
+        caches["shared"].clear()
+        self.router = ReplicaRouter()
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads outside replica blocks are left to the primary."""
+
+        self.assertIsNone(self.router.db_for_read(None))
+
+    def test_reads_in_block_use_replica(self):
+        """Test reads inside replica blocks go to a replica."""
+
+        with read_from_replica():
+            self.assertIn(self.router.db_for_read(None), ["replica1", "replica2"])
+            self.assertEqual(self.router.db_for_write(None), "default")
+        with read_from_replica(False):
+            self.assertIsNone(self.router.db_for_read(None))
+
+    def test_user_pinned_to_primary_after_write(self):
+        """Test users read from the primary for a while after writing."""
+
+        self.assertTrue(replica_reads_allowed(1))
+
+        pin_to_primary(1)
+
+        self.assertFalse(replica_reads_allowed(1))
+        self.assertTrue(replica_reads_allowed(2))
+
+    def test_only_primary_migrates(self):
+        """Test migrations are not run on replicas."""
+
+        self.assertTrue(self.router.allow_migrate("default", "core"))
+        self.assertFalse(self.router.allow_migrate("replica1", "core"))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test nothing is routed without configured replicas."""
+
+        with read_from_replica(replica_reads_allowed(1)):
+            self.assertIsNone(self.router.db_for_read(None))
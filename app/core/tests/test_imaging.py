@@ -0,0 +1,116 @@
+"""
+Tests for image processing helpers.
+"""
+
+import io
+
+import PIL.Image
+
+from django.test import SimpleTestCase
+
+from core import imaging
+
+
+def create_image_file(size, image_format="JPEG", orientation=None):
+    """Create and return an in-memory image file."""
+
+    img = PIL.Image.new("RGB", size, color=(255, 0, 0))
+    exif = PIL.Image.Exif()
+    exif[0x010F] = "Camera maker"
+    if orientation:
+        exif[imaging.EXIF_ORIENTATION] = orientation
+    file = io.BytesIO()
+    img.save(file, format=image_format, exif=exif.tobytes())
+    file.seek(0)
+
+    return file
+
+
+class ImagingTests(SimpleTestCase):
+    """Tests for decoding and thumbnail rendering."""
+
+    def test_read_image_header(self):
+        """Test reading image dimensions and format from the header."""
+
+        file = create_image_file((30, 20))
+        file.seek(5)
+
+        self.assertEqual(imaging.read_image_header(file), (30, 20, "JPEG"))
+        self.assertEqual(file.tell(), 5)
+
+    def test_decode_image_applies_exif_orientation(self):
+        """Test decoded image is rotated upright according to EXIF."""
+
+        decoded = imaging.decode_image(create_image_file((40, 20), orientation=6))
+
+        self.assertEqual((decoded.width, decoded.height), (20, 40))
+        self.assertEqual(decoded.format, "JPEG")
+        self.assertEqual(
+            decoded.exif, {"make": "Camera maker", "orientation": 6}
+        )
+
+    def test_render_thumbnail_strips_metadata(self):
+        """Test thumbnails keep the aspect ratio and carry no EXIF data."""
+
+        decoded = imaging.decode_image(create_image_file((40, 20), orientation=6))
+
+        width, buffer = imaging.render_thumbnail(decoded, 10)
+
+        with PIL.Image.open(buffer) as thumbnail:
+            self.assertEqual(thumbnail.size, (width, 10))
+            self.assertEqual(width, 5)
+            self.assertEqual(len(thumbnail.getexif()), 0)
+            self.assertNotIn("exif", thumbnail.info)
+
+    def test_difference_hash_of_copies(self):
+        """Test resized copies hash alike and other images do not."""
+
+        img = PIL.Image.linear_gradient("L").rotate(45).convert("RGB")
+        other = PIL.Image.radial_gradient("L").convert("RGB")
+
+        value = imaging.difference_hash(imaging.placeholder_sample(img))
+        copy = imaging.difference_hash(
+            imaging.placeholder_sample(img.resize((100, 100)))
+        )
+        other = imaging.difference_hash(imaging.placeholder_sample(other))
+
+        self.assertLessEqual(imaging.hamming_distance(value, copy), 4)
+        self.assertGreater(imaging.hamming_distance(value, other), 10)
+        self.assertGreaterEqual(value, -(1 << 63))
+        self.assertLess(value, 1 << 63)
+
+    def test_placeholders(self):
+        """Test the blurhash and dominant color of a sampled image."""
+
+        img = PIL.Image.new("RGB", (300, 200), color=(255, 0, 0))
+        img.paste((0, 0, 255), (0, 0, 100, 200))
+        sample = imaging.placeholder_sample(img)
+
+        value = imaging.encode_blurhash(sample)
+        flat = imaging.encode_blurhash(
+            imaging.placeholder_sample(PIL.Image.new("RGB", (10, 10), (255, 0, 0)))
+        )
+
+        self.assertEqual(sample.size, (32, 32))
+        self.assertEqual(len(value), 28)
+        # 4 x 3 components, then the average color
+        self.assertEqual(value[0], "L")
+        self.assertNotEqual(value, flat)
+        self.assertEqual(flat[2:6], imaging.base83(0xFF0000, 4))
+        self.assertEqual(imaging.dominant_color(sample), "#ff0000")
+
+    def test_placeholder_sample_of_transparent_images(self):
+        """Test transparent areas are sampled on gray rather than black."""
+
+        img = PIL.Image.new("RGBA", (300, 200), (0, 0, 0, 0))
+        img.paste((255, 0, 0, 255), (0, 0, 150, 200))
+        palette = img.convert("RGB").convert("P")
+        palette.info["transparency"] = palette.getpixel((299, 0))
+
+        for image in (img, img.convert("LA"), palette):
+            with self.subTest(mode=image.mode):
+                sample = imaging.placeholder_sample(image)
+                self.assertEqual(sample.mode, "RGB")
+                self.assertEqual(
+                    sample.getpixel((31, 0)), imaging.PLACEHOLDER_BACKGROUND
+                )
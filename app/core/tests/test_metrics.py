@@ -0,0 +1,72 @@
+"""
+Tests for the Prometheus metrics.
+"""
+
+from prometheus_client import REGISTRY
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import models
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+    """Tests for collecting and exporting metrics."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="test",
+            password="test1234",
+            tier=models.Tier.objects.create(name="test"),
+        )
+
+    def test_metrics_endpoint(self):
+        """Test metrics are exported in the Prometheus format."""
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"image_api_request_duration_seconds", response.content)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_viewset_requests_recorded(self):
+        """Test requests, durations and queries of viewsets are recorded."""
+
+        labels = {"view": "ImageViewSet", "action": "list"}
+        requests = sample("image_api_requests_total", status="200", **labels)
+        queries = sample("image_api_request_db_queries_sum", **labels)
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(reverse("image:image-list"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sample("image_api_requests_total", status="200", **labels),
+            requests + 1,
+        )
+        self.assertGreater(
+            sample("image_api_request_db_queries_sum", **labels), queries
+        )
+
+    def test_invalid_expiring_links_counted(self):
+        """Test invalid expiring links are counted."""
+
+        invalid = sample("expiring_link_requests_total", result="invalid")
+
+        response = self.client.get("/invalid?exp=1")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            sample("expiring_link_requests_total", result="invalid"), invalid + 1
+        )
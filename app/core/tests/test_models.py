@@ -5,6 +5,7 @@ Tests for models.
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import connection
 
 from core import models
 
@@ -120,3 +121,71 @@ class ModelTests(TestCase):
             )
 
         self.assertEqual(models.ThumbnailSize.objects.count(), 0)
+
+
+class QueryPlanTests(TestCase):
+    """Test the per-user query patterns are served by index scans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed enough rows for the planner to prefer indexes."""
+        tier = models.Tier.objects.create(name="test", thumbnails=True)
+        sizes = [
+            models.ThumbnailSize.objects.create(tier=tier, height=height)
+            for height in (200, 400)
+        ]
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f"user{number}", tier=tier)
+            for number in range(50)
+        )
+        images = models.Image.objects.bulk_create(
+            models.Image(user=user, image=f"uploads/images/{user.id}/{number}.jpg")
+            for user in users
+            for number in range(100)
+        )
+        models.Thumbnail.objects.bulk_create(
+            models.Thumbnail(
+                user_id=image.user_id,
+                image=image,
+                height=size,
+                thumbnail=f"uploads/images/{image.user_id}/{image.id}.jpg",
+            )
+            for image in images
+            for size in sizes
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_image, core_thumbnail")
+
+        cls.user, cls.image, cls.size = users[0], images[0], sizes[0]
+
+    def assertIndexScan(self, queryset, index_name=None):
+        plan = queryset.explain()
+        if index_name:
+            self.assertIn(index_name, plan)
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_images_of_user_use_index(self):
+        """Test listing and retrieving images of a user scans the index."""
+
+        images = models.Image.objects.filter(user=self.user)
+
+        self.assertIndexScan(images, "image_user_id_idx")
+        # The primary key and the (user, id) index serve this lookup equally
+        self.assertIndexScan(images.filter(id=self.image.id))
+
+    def test_thumbnails_of_user_use_index(self):
+        """Test listing thumbnails of a user scans the index."""
+
+        thumbnails = models.Thumbnail.objects.filter(user=self.user)
+
+        self.assertIndexScan(thumbnails, "thumbnail_user_id_idx")
+
+    def test_thumbnails_of_image_use_index(self):
+        """Test looking up thumbnails of an image and size scans the index."""
+
+        thumbnails = models.Thumbnail.objects.filter(image=self.image)
+
+        self.assertIndexScan(thumbnails, "thumbnail_image_height_idx")
+        self.assertIndexScan(
+            thumbnails.filter(height=self.size), "thumbnail_image_height_idx"
+        )
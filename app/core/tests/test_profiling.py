@@ -0,0 +1,107 @@
+"""
+Tests for profiling of requests.
+"""
+
+import marshal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import models
+
+
+IMAGE_URL = reverse("image:image-list")
+
+
+@override_settings(PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTests(TestCase):
+    """Tests for sampling and storing request profiles."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+        tier = models.Tier.objects.create(name="test")
+        self.user = get_user_model().objects.create_user(
+            username="test", password="test1234", tier=tier
+        )
+        self.staff = get_user_model().objects.create_user(
+            username="staff", password="test1234", tier=tier, is_staff=True
+        )
+
+    def get_images(self, user, **headers):
+        token = Token.objects.create(user=user)
+        return self.client.get(
+            IMAGE_URL, HTTP_AUTHORIZATION=f"Token {token.key}", **headers
+        )
+
+    def test_requests_not_sampled(self):
+        """Test requests are not profiled by default."""
+
+        response = self.get_images(self.user)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertFalse(models.RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_stored(self):
+        """Test a sampled request is stored with its stats and queries."""
+
+        response = self.get_images(self.user)
+
+        profile = models.RequestProfile.objects.get()
+        self.assertEqual(response["X-Profile-Id"], str(profile.id))
+        self.assertEqual(profile.user, self.user)
+        self.assertEqual(profile.path, IMAGE_URL)
+        self.assertEqual(profile.status_code, 200)
+        self.assertGreater(profile.query_count, 0)
+        self.assertEqual(len(profile.queries), profile.query_count)
+        self.assertTrue(marshal.loads(bytes(profile.stats)))
+        self.assertIn("cumulative", profile.stats_summary())
+
+    def test_header_of_staff_user(self):
+        """Test staff users can profile a request with the header."""
+
+        self.get_images(self.staff, HTTP_X_PROFILE="1")
+
+        self.assertEqual(models.RequestProfile.objects.get().user, self.staff)
+
+    def test_header_of_other_users_ignored(self):
+        """Test the header is ignored for users who are not staff."""
+
+        self.get_images(self.user, HTTP_X_PROFILE="1")
+        self.client.get(IMAGE_URL, HTTP_X_PROFILE="1")
+
+        self.assertFalse(models.RequestProfile.objects.exists())
+
+    def test_admin_download(self):
+        """Test stored profiles can be downloaded in the admin."""
+
+        self.get_images(self.staff, HTTP_X_PROFILE="1")
+        profile = models.RequestProfile.objects.get()
+        admin = get_user_model().objects.create_superuser(
+            username="admin", password="test1234"
+        )
+        self.client.force_login(admin)
+
+        change = self.client.get(
+            reverse("admin:core_requestprofile_change", args=[profile.id])
+        )
+        stats = self.client.get(
+            reverse("admin:core_requestprofile_download", args=[profile.id, "stats"])
+        )
+        queries = self.client.get(
+            reverse(
+                "admin:core_requestprofile_download", args=[profile.id, "queries"]
+            )
+        )
+
+        self.assertContains(change, "Slowest functions")
+        self.assertEqual(stats.content, bytes(profile.stats))
+        self.assertIn("attachment", stats["Content-Disposition"])
+        self.assertEqual(queries.json(), profile.queries)
@@ -0,0 +1,55 @@
+"""
+Tests for the token bucket rate limiter.
+"""
+
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+
+from core.ratelimit import TokenBucket, parse_rate
+
+
+@patch("core.ratelimit.time.time")
+class TokenBucketTests(SimpleTestCase):
+    """Tests for the token bucket."""
+
+    def setUp(self):
+        caches["shared"].clear()
+
+    def test_bucket_allows_burst_up_to_limit(self, patched_time):
+        """Test the bucket allows `limit` requests and then denies."""
+
+        patched_time.return_value = 1000.0
+        bucket = TokenBucket(3, 60)
+
+        states = [bucket.consume("key") for _ in range(4)]
+
+        self.assertEqual([state.allowed for state in states], [True] * 3 + [False])
+        self.assertEqual([state.remaining for state in states], [2, 1, 0, 0])
+        self.assertEqual(states[-1].retry_after, 20)
+
+    def test_bucket_refills_over_time(self, patched_time):
+        """Test tokens come back evenly over the period."""
+
+        patched_time.return_value = 1000.0
+        bucket = TokenBucket(3, 60)
+        for _ in range(3):
+            bucket.consume("key")
+
+        patched_time.return_value = 1020.0
+        self.assertTrue(bucket.consume("key").allowed)
+        self.assertFalse(bucket.consume("key").allowed)
+
+        patched_time.return_value = 2000.0
+        self.assertEqual(bucket.consume("key").remaining, 2)
+
+    def test_parse_rate(self, patched_time):
+        """Test parsing rates and rejecting invalid ones."""
+
+        self.assertEqual(parse_rate("10/minute"), (10, 60))
+        self.assertEqual(parse_rate("5/h"), (5, 3600))
+        for rate in ("10", "0/s", "x/s", "10/week", None):
+            with self.assertRaises(ValidationError):
+                parse_rate(rate)
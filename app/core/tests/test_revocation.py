@@ -0,0 +1,131 @@
+"""
+Tests for the revocation of expiring links.
+"""
+
+import time
+from unittest.mock import patch
+
+from redis.exceptions import RedisError
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+
+from core import models, revocation
+
+
+class BloomFilterTests(TestCase):
+    """Tests for the Bloom filter of revoked links."""
+
+    def test_added_keys_are_present(self):
+        """Test there are no false negatives."""
+
+        keys = [str(i) for i in range(1000)]
+        bloom = revocation.BloomFilter.for_capacity(1000, 0.01)
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        """Test absent keys are found at about the configured rate."""
+
+        bloom = revocation.BloomFilter.for_capacity(1000, 0.01)
+        for i in range(1000):
+            bloom.add(str(i))
+
+        others = [f"other-{i}" for i in range(10000)]
+        false_positives = sum(key in bloom for key in others)
+
+        self.assertLess(false_positives, 200)
+
+
+class RevocationTests(TestCase):
+    """Tests for revoking links and verifying them."""
+
+    def setUp(self):
+        caches["shared"].clear()
+        self.user = get_user_model().objects.create_user(
+            username="test",
+            password="test1234",
+            tier=models.Tier.objects.create(name="test"),
+        )
+        self.expires = int(time.time()) + 500
+        self.link_id = "a" * 32
+
+    def test_links_verified_without_queries(self):
+        """Test verifying a link that was not revoked needs no query."""
+
+        revocation.rebuild_filter()
+
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation.is_revoked(self.link_id))
+
+    def test_revoked_link(self):
+        """Test a revoked link is found by other workers."""
+
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke_link(self.user, self.link_id, self.expires)
+        # Another worker holds the filter of an older version
+        revocation._current = (None, None)
+
+        self.assertTrue(revocation.is_revoked(self.link_id))
+        self.assertFalse(revocation.is_revoked("b" * 32))
+
+    def test_rebuild_after_cache_loss(self):
+        """Test the filter is rebuilt from the table when it is gone."""
+
+        models.RevokedLink.objects.create(
+            link_id=self.link_id,
+            user=self.user,
+            expires="2999-01-01T00:00Z",
+        )
+        caches["shared"].clear()
+
+        self.assertTrue(revocation.is_revoked(self.link_id))
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation.is_revoked("b" * 32))
+
+    def test_table_read_while_filter_rebuilt(self):
+        """Test workers read the table while another one rebuilds the filter."""
+
+        models.RevokedLink.objects.create(
+            link_id=self.link_id,
+            user=self.user,
+            expires="2999-01-01T00:00Z",
+        )
+        caches["shared"].clear()
+        caches["shared"].add(revocation.REBUILD_KEY, 1)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(revocation.is_revoked(self.link_id))
+        with self.assertNumQueries(1):
+            self.assertFalse(revocation.is_revoked("b" * 32))
+        self.assertIsNone(caches["shared"].get(revocation.VERSION_KEY))
+
+    def test_table_read_without_cache(self):
+        """Test links are verified against the table when the cache is down."""
+
+        models.RevokedLink.objects.create(
+            link_id=self.link_id,
+            user=self.user,
+            expires="2999-01-01T00:00Z",
+        )
+
+        with patch.object(caches["shared"], "get", side_effect=RedisError):
+            self.assertTrue(revocation.is_revoked(self.link_id))
+            self.assertFalse(revocation.is_revoked("b" * 32))
+
+    def test_expired_revocations_deleted_on_revoke(self):
+        """Test revoking a link deletes revocations of expired links."""
+
+        models.RevokedLink.objects.create(
+            link_id="0" * 32, user=self.user, expires="2000-01-01T00:00Z"
+        )
+
+        revocation.revoke_link(self.user, self.link_id, self.expires)
+
+        self.assertEqual(
+            list(models.RevokedLink.objects.values_list("link_id", flat=True)),
+            [self.link_id],
+        )
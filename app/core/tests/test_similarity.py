@@ -0,0 +1,124 @@
+"""
+Tests for the near-duplicate search of images.
+"""
+
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from core import models, similarity
+from core.imaging import hamming_distance
+
+
+class MultiIndexHashTests(SimpleTestCase):
+    """Tests for the multi-index hash of perceptual hashes."""
+
+    def setUp(self):
+        rng = random.Random(49)
+        self.hashes = [rng.getrandbits(64) - (1 << 63) for _ in range(2000)]
+        # Near copies of some hashes
+        self.hashes += [
+            value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+            for value in self.hashes[:50]
+        ]
+        self.index = similarity.MultiIndexHash()
+        for id, value in enumerate(self.hashes):
+            self.index.add(value, id)
+
+    def test_search_matches_brute_force(self):
+        """Test the index finds exactly the hashes within the distance."""
+
+        for value in self.hashes[:20]:
+            for max_distance in (0, 3, 10, 32):
+                expected = sorted(
+                    (hamming_distance(value, other), id)
+                    for id, other in enumerate(self.hashes)
+                    if hamming_distance(value, other) <= max_distance
+                )
+                self.assertEqual(self.index.search(value, max_distance), expected)
+        self.assertEqual(self.index.size, len(self.hashes))
+
+    def test_search_checks_few_hashes(self):
+        """Test a search at the default distance checks a few of the hashes."""
+
+        candidates = self.index.candidates(
+            self.hashes[0], similarity.DEFAULT_DISTANCE
+        )
+
+        self.assertLess(len(candidates), len(self.hashes) * 0.05)
+
+    def test_add_again_and_discard(self):
+        """Test adding an id again replaces its hash and discarding drops it."""
+
+        self.index.add(self.hashes[1], 0)
+        self.index.discard(1)
+
+        self.assertEqual(self.index.search(self.hashes[0], 0), [])
+        self.assertEqual(self.index.search(self.hashes[1], 0), [(0, 0)])
+        self.assertEqual(self.index.size, len(self.hashes) - 1)
+
+    def test_search_empty_index(self):
+        """Test searching an index without hashes finds nothing."""
+
+        self.assertEqual(similarity.MultiIndexHash().search(0, 10), [])
+
+
+class SimilarityIndexTests(TestCase):
+    """Tests for the per worker indexes of the users' hashes."""
+
+    def setUp(self):
+        caches["shared"].clear()
+        similarity._indexes.clear()
+        self.user = get_user_model().objects.create_user(
+            username="test",
+            password="test1234",
+            tier=models.Tier.objects.create(name="test"),
+        )
+        self.image = self.create_image(0x0F0F)
+
+    def create_image(self, dhash):
+        # Created without the upload signal, which hashes the file
+        return models.Image.objects.bulk_create(
+            [models.Image(user=self.user, image="uploads/a.jpg", dhash=dhash)]
+        )[0]
+
+    def test_uploads_added_without_rebuild(self):
+        """Test uploads are searched without reading all hashes again."""
+
+        with self.assertNumQueries(1):
+            similarity.similar_images(self.user.id, 0x0F0F, 0)
+        upload = self.create_image(0x0F0E)
+        similarity.add_to_similarity_index(self.user.id, upload.id, 0x0F0E)
+
+        with self.assertNumQueries(0):
+            found = similarity.similar_images(self.user.id, 0x0F0F, 1)
+
+        self.assertEqual(found, [(0, self.image.id), (1, upload.id)])
+
+    def test_rebuild_when_uploads_gone(self):
+        """Test the index is read again when uploads left the shared cache."""
+
+        similarity.similar_images(self.user.id, 0x0F0F, 0)
+        upload = self.create_image(0x0F0F)
+        similarity.add_to_similarity_index(self.user.id, upload.id, 0x0F0F)
+        version = caches["shared"].get(similarity.index_key(self.user.id))
+        caches["shared"].delete(similarity.added_key(self.user.id, version, 1))
+
+        with self.assertNumQueries(1):
+            found = similarity.similar_images(self.user.id, 0x0F0F, 0)
+
+        self.assertEqual(found, [(0, self.image.id), (0, upload.id)])
+
+    def test_deletions_removed_without_rebuild(self):
+        """Test deleted images are dropped without reading all hashes again."""
+
+        upload = self.create_image(0x0F0F)
+        similarity.similar_images(self.user.id, 0x0F0F, 0)
+        similarity.remove_from_similarity_index(self.user.id, upload.id)
+
+        with self.assertNumQueries(0):
+            found = similarity.similar_images(self.user.id, 0x0F0F, 0)
+
+        self.assertEqual(found, [(0, self.image.id)])
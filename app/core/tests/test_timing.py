@@ -0,0 +1,115 @@
+"""
+Tests for the timing of request stages.
+"""
+
+import json
+
+import PIL.Image
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import models
+from core.timing import request_timings, timed
+
+
+IMAGE_URL = reverse("image:image-list")
+
+
+def image_upload():
+    """Return an uploaded JPEG image."""
+
+    file = SimpleUploadedFile("test.jpg", b"", "image/jpeg")
+    PIL.Image.new("RGB", (40, 20)).save(file, "JPEG")
+    file.seek(0)
+    return file
+
+
+def stages(header):
+    """Return the metric names of a Server-Timing header."""
+
+    return [metric.split(";")[0] for metric in header.split(", ")]
+
+
+@override_settings(SERVER_TIMING=True, TIMING_LOG=False)
+class ServerTimingTests(TestCase):
+    """Tests for Server-Timing headers and timing logs."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+        tier = models.Tier.objects.create(name="test", original_size=True)
+        models.ThumbnailSize.objects.create(tier=tier, height=10)
+        self.user = get_user_model().objects.create_user(
+            username="test", password="test1234", tier=tier
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        for image in models.Image.objects.filter(user=self.user):
+            image.delete()
+        for thumbnail in models.Thumbnail.objects.filter(user=self.user):
+            thumbnail.delete()
+
+    def test_upload_stages(self):
+        """Test the stages of an upload are in the Server-Timing header."""
+
+        response = self.client.post(
+            IMAGE_URL, {"image": image_upload()}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            {
+                "auth",
+                "perm",
+                "db",
+                "serialize",
+                "storage",
+                "decode",
+                "thumbnail",
+                "total",
+            }.issubset(stages(response["Server-Timing"]))
+        )
+
+    def test_list_stages(self):
+        """Test listing is timed and the timings of a request are reset."""
+
+        response = self.client.get(IMAGE_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("db", stages(response["Server-Timing"]))
+        self.assertIsNone(request_timings.get())
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        """Test no header is sent when timing is disabled."""
+
+        response = self.client.get(IMAGE_URL)
+
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(SERVER_TIMING=False, TIMING_LOG=True)
+    def test_timing_log(self):
+        """Test the timings are logged as JSON."""
+
+        with self.assertLogs("core.timing") as logs:
+            self.client.get(IMAGE_URL)
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "image:image-list")
+        self.assertEqual(entry["status"], 200)
+        self.assertIn("db", entry["stages"])
+
+    def test_timed_outside_of_requests(self):
+        """Test timed blocks outside of timed requests are ignored."""
+
+        with timed("db"):
+            pass
+
+        self.assertIsNone(request_timings.get())
@@ -0,0 +1,125 @@
+"""
+Timing of request stages for Server-Timing headers and timing logs.
+
+Code running in a request wraps a stage in timed(), which adds its
+duration to the timings of the current request. Outside of timed
+requests it does nothing. Stages can overlap, e.g. queries run while
+serializing count for both "db" and "serialize".
+"""
+
+import contextlib
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Durations in seconds and counts by stage of the current request
+request_timings = ContextVar("request_timings", default=None)
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """Add the time spent in the block to a stage of the current request.
+
+    Can be used as a decorator as well.
+    """
+
+    timings = request_timings.get()
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(timings, stage, time.perf_counter() - start)
+
+
+def add_timing(timings, stage, duration):
+    total, count = timings.get(stage, (0.0, 0))
+    timings[stage] = (total + duration, count + 1)
+
+
+class QueryTimer:
+    """Database execute wrapper adding queries to the "db" stage."""
+
+    def __init__(self, timings):
+        self.timings = timings
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            add_timing(self.timings, "db", time.perf_counter() - start)
+
+
+class ViewTimingMixin:
+    """Time authentication, permission checks and rendering of a viewset."""
+
+    def perform_authentication(self, request):
+        with timed("auth"):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with timed("perm"):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with timed("perm"):
+            super().check_object_permissions(request, obj)
+
+    def check_throttles(self, request):
+        with timed("throttle"):
+            super().check_throttles(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request_timings.get() is not None:
+            # Rendered here instead of by the handler to be timed
+            with timed("serialize"):
+                response.render()
+        return response
+
+
+class TimedSerializerMixin:
+    """Time the representation of every serialized object."""
+
+    def to_representation(self, instance):
+        with timed("serialize"):
+            return super().to_representation(instance)
+
+
+def server_timing(timings, total):
+    """Return the Server-Timing header value of the timings."""
+
+    metrics = [
+        f'{stage};dur={duration * 1000:.2f};desc="{count}x"'
+        for stage, (duration, count) in timings.items()
+    ]
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+def log_timings(request, response, timings, total):
+    """Write the timings of a request as a JSON log line."""
+
+    match = request.resolver_match
+    logger.info(
+        json.dumps(
+            {
+                "method": request.method,
+                "path": request.path,
+                "view": match.view_name if match else None,
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 2),
+                "stages": {
+                    stage: {"ms": round(duration * 1000, 2), "count": count}
+                    for stage, (duration, count) in timings.items()
+                },
+            }
+        )
+    )
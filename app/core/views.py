@@ -0,0 +1,34 @@
+"""
+Views of the core app.
+"""
+
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.cache import never_cache
+
+from core.metrics import render_metrics
+
+
+@never_cache
+def metrics(request):
+    """Export Prometheus metrics of all worker processes."""
+
+    content, content_type = render_metrics()
+    return HttpResponse(content, content_type=content_type)
+
+
+def lazy_view(view_class, **initkwargs):
+    """Return a view importing its class by dotted path on the first request.
+
+    Keeps heavy modules of rarely used views out of worker startup.
+    """
+
+    view = None
+
+    def load_view(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(view_class).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    return load_view
@@ -0,0 +1,206 @@
+"""
+Async views for the image API hot paths, served in ASGI mode.
+
+Reads are handled natively with the async ORM. Uploads and deletes are
+passed to the regular viewsets, which Django runs in a per-request worker
+thread, so Pillow work never blocks the event loop.
+"""
+
+import functools
+
+from asgiref.sync import sync_to_async
+
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from core.db.routers import read_from_replica, replica_reads_allowed
+from core.metrics import observe_request
+from core.models import Image, Thumbnail
+from core.timing import timed
+from .caching import vary_on_authorization
+from .serializers import ImageListSerializer, ImageSerializer
+from .throttling import TierRateThrottle, set_rate_limit_headers
+from .views import (
+    ImageViewSet,
+    LinkViewSet,
+    build_expiring_link,
+    check_user_acces_to_expiring_link,
+    check_user_acces_to_original_image,
+    check_user_acces_to_thumbnails,
+    hide_original_path,
+    parse_link_height,
+    parse_link_time,
+)
+
+image_list_view = ImageViewSet.as_view({"get": "list", "post": "create"})
+image_detail_view = ImageViewSet.as_view({"get": "retrieve", "delete": "destroy"})
+
+
+def json_response(data=None, status_code=status.HTTP_200_OK):
+    """Render data the way the DRF JSON renderer does."""
+
+    with timed("serialize"):
+        content = JSONRenderer().render(data) if data is not None else b""
+    response = HttpResponse(
+        content, status=status_code, content_type="application/json"
+    )
+    return vary_on_authorization(response)
+
+
+async def authenticate(request):
+    """Async counterpart of TokenAuthentication, returns a response on failure."""
+
+    auth = request.headers.get("Authorization", "").split()
+    if not auth or auth[0].lower() != "token":
+        detail = "Authentication credentials were not provided."
+    elif len(auth) != 2:
+        detail = "Invalid token header."
+    else:
+        with timed("auth"):
+            token = (
+                await Token.objects.select_related("user__tier")
+                .filter(key=auth[1])
+                .afirst()
+            )
+        if token and token.user.is_active:
+            request.user = token.user
+            return None
+        detail = "Invalid token."
+
+    response = json_response({"detail": detail}, status.HTTP_401_UNAUTHORIZED)
+    response["WWW-Authenticate"] = "Token"
+    return response
+
+
+def observed(view, action):
+    """Record metrics of GET requests, other methods are left to the viewsets."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != "GET":
+                return await function(request, *args, **kwargs)
+            with observe_request(view, action, count_queries=False) as labels:
+                response = await function(request, *args, **kwargs)
+                labels["status"] = response.status_code
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+@observed("ImageViewSet", "list")
+async def image_list(request):
+    """List the images of the user."""
+
+    if request.method != "GET":
+        return await sync_to_async(image_list_view)(request)
+    if response := await authenticate(request):
+        return response
+
+    serializer = ImageListSerializer(
+        request, show_original=check_user_acces_to_original_image(request)
+    )
+    use_replica = await sync_to_async(replica_reads_allowed)(request.user.pk)
+    with read_from_replica(use_replica):
+        queryset = serializer.rows(Image.objects.filter(user=request.user))
+        rows = [row async for row in queryset]
+
+    return json_response(serializer.to_representation(rows))
+
+
+@observed("ImageViewSet", "retrieve")
+async def image_detail(request, pk):
+    """Retrieve an image of the user."""
+
+    if request.method != "GET":
+        return await sync_to_async(image_detail_view)(request, pk=pk)
+    if response := await authenticate(request):
+        return response
+
+    use_replica = await sync_to_async(replica_reads_allowed)(request.user.pk)
+    with read_from_replica(use_replica):
+        image = await Image.objects.filter(user=request.user, pk=pk).afirst()
+    if image is None:
+        return json_response({"detail": "Not found."}, status.HTTP_404_NOT_FOUND)
+
+    data = ImageSerializer(image, context={"request": request}).data
+    if not check_user_acces_to_original_image(request):
+        hide_original_path(data)
+
+    return json_response(data)
+
+
+async def expiring_link(request, pk):
+    """Return the response with an expiring link to an image of the user."""
+
+    if not check_user_acces_to_expiring_link(request):
+        return json_response(status_code=status.HTTP_403_FORBIDDEN)
+
+    if "height" in request.GET:
+        # A link to the thumbnail of the image with that height
+        if not check_user_acces_to_thumbnails(request):
+            return json_response(status_code=status.HTTP_403_FORBIDDEN)
+        height = parse_link_height(request.GET["height"])
+        if height is None:
+            return json_response(status_code=status.HTTP_400_BAD_REQUEST)
+        queryset = Thumbnail.objects.filter(
+            user=request.user, image_id=pk, height__height=height
+        ).only("thumbnail")
+    else:
+        queryset = Image.objects.filter(user=request.user, pk=pk).only("image")
+
+    use_replica = await sync_to_async(replica_reads_allowed)(request.user.pk)
+    with read_from_replica(use_replica):
+        target = await queryset.afirst()
+    if target is None:
+        return json_response({"detail": "Not found."}, status.HTTP_404_NOT_FOUND)
+
+    request_time = parse_link_time(request.GET.get("time"))
+    if request_time is None:
+        return json_response(status_code=status.HTTP_400_BAD_REQUEST)
+
+    url = target.image.url if isinstance(target, Image) else target.thumbnail.url
+    return json_response(
+        {
+            "url": build_expiring_link(request, url, request_time),
+            "expires_in": request_time,
+        }
+    )
+
+
+@observed("LinkViewSet", "retrieve")
+async def link_detail(request, pk):
+    """Generate an expiring link to an image of the user."""
+
+    if response := await authenticate(request):
+        return response
+    if request.method != "GET":
+        return json_response(
+            {"detail": f'Method "{request.method}" not allowed.'},
+            status.HTTP_405_METHOD_NOT_ALLOWED,
+        )
+
+    throttle = TierRateThrottle()
+    view = LinkViewSet(action="retrieve")
+    if await sync_to_async(throttle.allow_request)(request, view):
+        response = await expiring_link(request, pk)
+    else:
+        response = json_response(
+            {"detail": "Request was throttled."},
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        response["Retry-After"] = throttle.wait()
+
+    if state := getattr(request, "rate_limit", None):
+        set_rate_limit_headers(response, state)
+    return response
+
+
+# Authentication is token based, so there is no session to protect
+image_list.csrf_exempt = True
+image_detail.csrf_exempt = True
+link_detail.csrf_exempt = True
@@ -0,0 +1,26 @@
+"""
+HTTP caching of image API responses.
+"""
+
+from django.utils.cache import patch_vary_headers
+
+
+def vary_on_authorization(response):
+    """Key cached copies of the response by the Authorization header.
+
+    The page cache and HTTP caches key responses by URL and the headers in
+    Vary only, so without it one user's data is served to another.
+    """
+
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+class PrivateCacheMixin:
+    """Cache responses of a token authenticated viewset per user and format."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # The renderer, JSON or MessagePack, is picked by the Accept header
+        patch_vary_headers(response, ("Accept",))
+        return vary_on_authorization(response)
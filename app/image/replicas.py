@@ -0,0 +1,36 @@
+"""
+Read replica routing for the image API views.
+"""
+
+from rest_framework.permissions import SAFE_METHODS
+
+from core.db.routers import pin_to_primary, replica_reads, replica_reads_allowed
+
+
+class ReplicaReadMixin:
+    """Serve read-only actions from a replica with read-your-writes stickiness.
+
+    Successful writes pin the user to the primary for REPLICA_STICKY_SECONDS.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            self.replica_token = replica_reads.set(
+                replica_reads_allowed(request.user.pk)
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if token := getattr(self, "replica_token", None):
+            replica_reads.reset(token)
+            self.replica_token = None
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(request.user.pk)
+
+        return super().finalize_response(request, response, *args, **kwargs)
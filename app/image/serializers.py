@@ -2,24 +2,132 @@
 Serilizers for image API.
 """
 
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.encoding import filepath_to_uri
+
 from rest_framework import serializers
+from core.links import LINK_TIME_MAX, LINK_TIME_MIN
 from core.models import Image, Thumbnail
+from core.serializers import (
+    FastSerializerMixin,
+    file_url_builder,
+    requested_fields,
+)
+from core.timing import TimedSerializerMixin, timed
+from core.imaging import ImageTooLarge, check_image_budget
 
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageSerializer(
+    TimedSerializerMixin, FastSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for images."""
 
     class Meta:
         model = Image
-        fields = ["id", "image"]
-        read_only_fields = ["id"]
+        fields = [
+            "id",
+            "image",
+            "width",
+            "height",
+            "file_size",
+            "format",
+            "content_hash",
+            "exif",
+            "blurhash",
+            "dominant_color",
+        ]
+        read_only_fields = [
+            "id",
+            "width",
+            "height",
+            "file_size",
+            "format",
+            "content_hash",
+            "exif",
+            "blurhash",
+            "dominant_color",
+        ]
         extra_kwargs = {"image": {"required": True}}
 
+    def validate_image(self, value):
+        """Reject images over the tier budget before anything is decoded."""
+
+        request = self.context.get("request")
+        try:
+            check_image_budget(value, getattr(request, "user", None))
+        except ImageTooLarge as error:
+            raise serializers.ValidationError(str(error))
+
+        return value
+
+
+class SimilarImageSerializer(ImageSerializer):
+    """Serializer for images near another one."""
+
+    distance = serializers.IntegerField(
+        read_only=True, help_text="Differing bits of the perceptual hashes."
+    )
+
+    class Meta(ImageSerializer.Meta):
+        fields = ImageSerializer.Meta.fields + ["distance"]
+
+
+class ImageListSerializer:
+    """Read-only serializer of image lists from values_list() rows.
+
+    Gives the data of ImageSerializer without building model instances
+    and serializer fields for every row. Without access to the original
+    its file name replaces the URL in the same pass.
+    """
+
+    def __init__(self, request, show_original=True):
+        requested = requested_fields({"request": request})
+        self.fields = [
+            name
+            for name in ImageSerializer.Meta.fields
+            if requested is None or name in requested
+        ]
+        if show_original:
+            self.file_url = file_url_builder(
+                Image._meta.get_field("image").storage, request
+            )
+        else:
+            self.file_url = self.file_name
 
-class ThumbnailSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def file_name(name):
+        return filepath_to_uri(name.rsplit("/", 1)[-1])
+
+    def rows(self, queryset):
+        """Return the queryset of the rows to serialize."""
+
+        return queryset.values_list(*self.fields)
+
+    def to_representation(self, rows):
+        """Return the serialized data of fetched rows."""
+
+        fields = self.fields
+        with timed("serialize"):
+            if "image" not in fields:
+                return [dict(zip(fields, row)) for row in rows]
+
+            index = fields.index("image")
+            file_url = self.file_url
+            data = []
+            for row in rows:
+                row = list(row)
+                row[index] = file_url(row[index]) if row[index] else None
+                data.append(dict(zip(fields, row)))
+        return data
+
+
+class ThumbnailSerializer(
+    TimedSerializerMixin, FastSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for thumbnails."""
 
     height = serializers.SerializerMethodField()
@@ -27,8 +135,24 @@ class ThumbnailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Thumbnail
-        fields = ["id", "image_id", "height", "thumbnail"]
-        read_only_fields = ["id", "image_id"]
+        fields = [
+            "id",
+            "image_id",
+            "height",
+            "width",
+            "file_size",
+            "format",
+            "content_hash",
+            "thumbnail",
+        ]
+        read_only_fields = [
+            "id",
+            "image_id",
+            "width",
+            "file_size",
+            "format",
+            "content_hash",
+        ]
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_height(self, obj):
@@ -36,10 +160,10 @@ class ThumbnailSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_image_id(self, obj):
-        return obj.image.id
+        return obj.image_id
 
 
-class LinkSerializer(serializers.ModelSerializer):
+class LinkSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for generating links."""
 
     time = serializers.IntegerField()
@@ -49,3 +173,114 @@ class LinkSerializer(serializers.ModelSerializer):
         fields = ["id", "time"]
         read_only_fields = ["id"]
         extra_kwargs = {"time": {"required": True}}
+
+
+class LinkBatchSerializer(serializers.Serializer):
+    """Serializer for generating links to many images at once."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.LINK_BATCH_MAX_IMAGES,
+    )
+    time = serializers.IntegerField(min_value=LINK_TIME_MIN, max_value=LINK_TIME_MAX)
+    height = serializers.IntegerField(
+        min_value=1,
+        required=False,
+        help_text="Height of the thumbnails to link instead of the images.",
+    )
+
+
+class ExpiringLinkSerializer(serializers.Serializer):
+    """Serializer for a generated link."""
+
+    url = serializers.URLField()
+    expires_in = serializers.IntegerField()
+
+
+class BatchLinkSerializer(serializers.Serializer):
+    """Serializer for a generated link in a batch."""
+
+    id = serializers.IntegerField()
+    url = serializers.URLField()
+
+
+class LinkBatchResultSerializer(serializers.Serializer):
+    """Serializer for the links generated in a batch."""
+
+    links = BatchLinkSerializer(many=True)
+    expires_in = serializers.IntegerField()
+
+
+class RevokeLinkSerializer(serializers.Serializer):
+    """Serializer for revoking a generated link."""
+
+    url = serializers.CharField()
+
+
+class VariantSerializer(serializers.Serializer):
+    """Serializer for one file variant of an image in a manifest."""
+
+    height = serializers.IntegerField()
+    width = serializers.IntegerField(allow_null=True)
+    url = serializers.CharField()
+    bytes = serializers.IntegerField(allow_null=True)
+    format = serializers.CharField()
+    original = serializers.BooleanField()
+
+
+class ManifestSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for images with all their variants, e.g. for srcset.
+
+    Thumbnails come aggregated as JSON in the "thumbnail_variants" field of
+    the queryset. The context tells which variants the user may see.
+    """
+
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Image
+        fields = [
+            "id",
+            "width",
+            "height",
+            "format",
+            "blurhash",
+            "dominant_color",
+            "variants",
+        ]
+        read_only_fields = fields
+
+    def file_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    @extend_schema_field(VariantSerializer(many=True))
+    def get_variants(self, obj):
+        variants = []
+        if self.context.get("thumbnails"):
+            variants = [
+                {
+                    "height": thumbnail["height"],
+                    "width": thumbnail["width"],
+                    "url": self.file_url(thumbnail["file"]),
+                    "bytes": thumbnail["bytes"],
+                    "format": thumbnail["format"],
+                    "original": False,
+                }
+                for thumbnail in obj.thumbnail_variants or []
+            ]
+        if self.context.get("original"):
+            variants.append(
+                {
+                    "height": obj.height,
+                    "width": obj.width,
+                    "url": self.file_url(obj.image.name),
+                    "bytes": obj.file_size,
+                    "format": obj.format,
+                    "original": True,
+                }
+            )
+
+        return variants
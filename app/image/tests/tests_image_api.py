@@ -2,23 +2,39 @@
 Tests for the image API.
 """
 
+import base64
 import os
+import json
+import struct
 import tempfile
+import zlib
+from unittest.mock import patch
+from urllib.parse import urlsplit
 
+import msgpack
 from PIL import Image
 
-from django.test import TestCase
+from django.core import signing
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core import models
+from core import models, similarity
+from core.links import LINK_SALT, parse_link
+from image import async_views
 
 
 IMAGE_URL = reverse("image:image-list")
 THUMBNAIL_URL = reverse("image:thumbnail-list")
+MANIFEST_URL = reverse("image:manifest-list")
+LINK_BATCH_URL = reverse("image:link-batch")
+LINK_REVOKE_URL = reverse("image:link-revoke")
 
 
 def image_detail_url(id):
@@ -39,6 +55,50 @@ def expiring_link_detail_url(id):
     return reverse("image:link-detail", args=[id])
 
 
+def upload_image(user, size=(10, 10), img=None):
+    """Save and return an image of the user, blank unless one is given."""
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+        (img or Image.new("RGB", size)).save(image_file, format="JPEG")
+        image_file.seek(0)
+        image = models.Image(user=user)
+        image.image.save("temp.jpg", image_file)
+    return image
+
+
+class UserImageTestCase(TestCase):
+    """Base of tests with an authenticated user, whose images are removed."""
+
+    def create_user(self, tier):
+        """Create the user of the tier and authenticate the client as them."""
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="test",
+            password="test1234",
+            tier=tier,
+        )
+        self.client.force_authenticate(self.user)
+
+    def post_image(self, size=(10, 10)):
+        """Upload a generated JPEG of the given size through the API."""
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            Image.new("RGB", size).save(image_file, format="JPEG")
+            image_file.seek(0)
+            return self.client.post(
+                IMAGE_URL, {"image": image_file}, format="multipart"
+            )
+
+    def tearDown(self):
+        """Clean up after test."""
+
+        for image in models.Image.objects.filter(user=self.user):
+            image.delete()
+        for thumbnail in models.Thumbnail.objects.filter(user=self.user):
+            thumbnail.delete()
+
+
 class PublicImageAPITests(TestCase):
     """Test unauthenticated API requests."""
 
@@ -84,6 +144,7 @@ class PrivateImageAPITests(TestCase):
 
     def setUp(self):
         """Create and return a user and a client."""
+        caches["default"].clear()
         self.client = APIClient()
         tier = models.Tier.objects.create(
             name="Test tier 2 thumbs",
@@ -138,6 +199,31 @@ class PrivateImageAPITests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_upload_image_stores_metadata(self):
+        """Test upright dimensions, format and placeholders are stored on upload."""
+
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            img = Image.new("RGB", (40, 20))
+            img.save(image_file, format="JPEG", exif=exif.tobytes())
+            image_file.seek(0)
+            response = self.client.post(
+                IMAGE_URL, {"image": image_file}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["width"], 20)
+        self.assertEqual(response.data["height"], 40)
+        self.assertEqual(response.data["format"], "JPEG")
+        image = models.Image.objects.get(user=self.user)
+        self.assertEqual((image.width, image.height), (20, 40))
+        self.assertEqual(image.exif, {"orientation": 6})
+        self.assertEqual(response.data["file_size"], image.image.size)
+        self.assertEqual(len(response.data["content_hash"]), 64)
+        self.assertEqual(len(response.data["blurhash"]), 28)
+        self.assertEqual(response.data["dominant_color"], "#000000")
+
     def test_list_images(self):
         """Test list of uploaded images."""
 
@@ -150,6 +236,29 @@ class PrivateImageAPITests(TestCase):
             os.path.exists(models.Image.objects.get(user=self.user).image.path)
         )
 
+    def test_list_images_matches_details(self):
+        """Test listed images carry the data of their detail view."""
+
+        self.client.post(IMAGE_URL, self.payload, format="multipart")
+
+        response = self.client.get(IMAGE_URL)
+        details = self.client.get(image_detail_url(response.data[0]["id"]))
+
+        self.assertEqual(response.data, [details.data])
+        self.assertTrue(response.data[0]["image"].startswith("http://testserver/"))
+
+    def test_list_images_hides_original_path(self):
+        """Test only the file name of originals is listed without access."""
+
+        self.client.post(IMAGE_URL, self.payload, format="multipart")
+        self.user.tier.original_size = False
+        self.user.tier.save()
+
+        response = self.client.get(IMAGE_URL)
+
+        image = models.Image.objects.get(user=self.user)
+        self.assertEqual(response.data[0]["image"], image.image.name.split("/")[-1])
+
     def test_image_details(self):
         """Test detail view of uploaded images."""
 
@@ -195,6 +304,10 @@ class PrivateImageAPITests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
+        for thumbnail in response.data:
+            self.assertEqual(thumbnail["width"], thumbnail["height"])
+            self.assertEqual(thumbnail["format"], "JPEG")
+            self.assertTrue(thumbnail["file_size"])
 
     def test_thumbnail_details(self):
         """Test detail view of generated thumbnails."""
@@ -231,3 +344,726 @@ class PrivateImageAPITests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("url", response.data)
+
+
+def create_png_header(width, height):
+    """Create a minimal valid PNG claiming the given size."""
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(b"\x00"))
+        + chunk(b"IEND", b"")
+    )
+
+
+class ImageUploadLimitTests(UserImageTestCase):
+    """Test the pixel and byte budget of uploaded images."""
+
+    def setUp(self):
+        """Create a user with a small upload budget."""
+        self.tier = models.Tier.objects.create(
+            name="Test tier limits",
+            max_image_pixels=50,
+        )
+        models.ThumbnailSize.objects.create(tier=self.tier, height=200)
+        self.create_user(self.tier)
+
+    def test_upload_over_pixel_limit_rejected(self):
+        """Test an image over the tier pixel limit is rejected before saving."""
+
+        response = self.post_image()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+        self.assertEqual(models.Image.objects.count(), 0)
+        self.assertEqual(models.Thumbnail.objects.count(), 0)
+
+    def test_upload_over_byte_limit_rejected(self):
+        """Test an image over the tier byte limit is rejected."""
+
+        self.tier.max_image_pixels = None
+        self.tier.max_image_bytes = 10
+        self.tier.save()
+
+        response = self.post_image()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(models.Image.objects.count(), 0)
+
+    @override_settings(IMAGE_MAX_PIXELS=100_000_000)
+    def test_upload_decompression_bomb_rejected(self):
+        """Test a tiny file claiming a huge resolution is never decoded."""
+
+        self.tier.max_image_pixels = None
+        self.tier.save()
+        payload = SimpleUploadedFile(
+            "bomb.png", create_png_header(12000, 12000), content_type="image/png"
+        )
+
+        with patch("PIL.ImageFile.ImageFile.load") as patched_load:
+            response = self.client.post(
+                IMAGE_URL, {"image": payload}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        patched_load.assert_not_called()
+        self.assertEqual(models.Image.objects.count(), 0)
+
+
+class StorageQuotaTests(UserImageTestCase):
+    """Test per-tier storage quotas."""
+
+    def setUp(self):
+        """Create a user with a storage quota."""
+        self.tier = models.Tier.objects.create(name="Test tier quota", max_images=1)
+        models.ThumbnailSize.objects.create(tier=self.tier, height=200)
+        self.create_user(self.tier)
+
+    def test_usage_counted_on_upload_and_delete(self):
+        """Test usage counters follow uploads and deletions."""
+
+        self.post_image()
+        image = models.Image.objects.get(user=self.user)
+        thumbnail = models.Thumbnail.objects.get(image=image)
+        usage = models.StorageUsage.objects.get(user=self.user)
+
+        self.assertEqual(usage.image_count, 1)
+        self.assertEqual(usage.bytes_used, image.file_size + thumbnail.file_size)
+
+        self.client.delete(image_detail_url(image.id))
+        usage.refresh_from_db()
+
+        self.assertEqual(usage.image_count, 0)
+        self.assertEqual(usage.bytes_used, 0)
+
+    def test_upload_over_image_count_quota_rejected(self):
+        """Test uploading over the tier image count quota is forbidden."""
+
+        self.assertEqual(self.post_image().status_code, status.HTTP_201_CREATED)
+        response = self.post_image()
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(models.Image.objects.filter(user=self.user).count(), 1)
+
+    def test_upload_over_storage_quota_rejected(self):
+        """Test uploading over the tier storage quota is forbidden."""
+
+        self.tier.max_images = None
+        self.tier.max_storage_bytes = 10
+        self.tier.save()
+
+        response = self.post_image()
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(models.Image.objects.filter(user=self.user).exists())
+
+
+class RateLimitTests(UserImageTestCase):
+    """Test rate limiting of uploads and expiring links."""
+
+    def setUp(self):
+        """Create a user with a low upload rate."""
+        caches["shared"].clear()
+        self.tier = models.Tier.objects.create(
+            name="Test tier rate",
+            expiring_link=True,
+            rate_limits={"upload": "1/minute", "link": None},
+        )
+        self.create_user(self.tier)
+
+    def test_upload_over_rate_limit_throttled(self):
+        """Test uploads over the tier rate return 429 with RateLimit headers."""
+
+        response = self.post_image()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["RateLimit-Limit"], "1")
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+        self.assertEqual(response["RateLimit-Policy"], "1;w=60")
+
+        response = self.post_image()
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+        self.assertIn("RateLimit-Reset", response)
+        self.assertEqual(models.Image.objects.filter(user=self.user).count(), 1)
+
+    def test_unthrottled_actions_have_no_headers(self):
+        """Test listing and unlimited scopes are not rate limited."""
+
+        self.post_image()
+        image = models.Image.objects.get(user=self.user)
+
+        response = self.client.get(IMAGE_URL)
+        self.assertNotIn("RateLimit-Limit", response)
+
+        response = self.client.get(f"{expiring_link_detail_url(image.id)}?time=500")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("RateLimit-Limit", response)
+
+
+# The primary stands in for a replica, reads routed to it are counted
+@override_settings(DATABASE_REPLICAS=["default"])
+@patch("core.db.routers.system_random.choice", return_value="default")
+class ReplicaRoutingTests(UserImageTestCase):
+    """Test read-only actions are served from replicas."""
+
+    def setUp(self):
+        """Create a user with an uploaded image."""
+        caches["shared"].clear()
+        # Responses cached by the cache middleware would skip the views
+        caches["default"].clear()
+        tier = models.Tier.objects.create(name="Test tier replica", thumbnails=True)
+        self.create_user(tier)
+        self.image = upload_image(self.user)
+
+    def test_reads_routed_to_replica(self, patched_choice):
+        """Test list and retrieve actions read from a replica."""
+
+        response = self.client.get(IMAGE_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(patched_choice.called)
+        patched_choice.reset_mock()
+
+        response = self.client.get(THUMBNAIL_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(patched_choice.called)
+
+    def test_reads_pinned_to_primary_after_write(self, patched_choice):
+        """Test a user reads own writes from the primary."""
+
+        response = self.client.delete(image_detail_url(self.image.id))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        patched_choice.reset_mock()
+
+        response = self.client.get(IMAGE_URL)
+
+        self.assertEqual(response.data, [])
+        self.assertFalse(patched_choice.called)
+
+        caches["shared"].clear()
+        caches["default"].clear()
+        self.client.get(IMAGE_URL)
+        self.assertTrue(patched_choice.called)
+
+
+class AsyncImageAPITests(UserImageTestCase):
+    """Test the async views used in ASGI mode."""
+
+    def setUp(self):
+        """Create a user with a token and an uploaded image."""
+        caches["shared"].clear()
+        self.factory = AsyncRequestFactory()
+        tier = models.Tier.objects.create(
+            name="Test tier async",
+            original_size=False,
+            expiring_link=True,
+        )
+        self.user = get_user_model().objects.create_user(
+            username="test",
+            password="test1234",
+            tier=tier,
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {"AUTHORIZATION": f"Token {self.token.key}"}
+        self.image = upload_image(self.user)
+
+    async def test_async_image_list_requires_token(self):
+        """Test the async image list rejects requests without a valid token."""
+
+        response = await async_views.image_list(self.factory.get(IMAGE_URL))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        request = self.factory.get(IMAGE_URL, AUTHORIZATION="Token invalid")
+        response = await async_views.image_list(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_image_list(self):
+        """Test the async image list hides original paths like the viewset."""
+
+        request = self.factory.get(IMAGE_URL, **self.headers)
+        response = await async_views.image_list(request)
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["id"], self.image.id)
+        self.assertNotIn("/", data[0]["image"])
+
+    async def test_async_image_detail_not_found(self):
+        """Test the async image detail of another id returns 404."""
+
+        url = image_detail_url(self.image.id + 1)
+        request = self.factory.get(url, **self.headers)
+        response = await async_views.image_detail(request, pk=self.image.id + 1)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_expiring_link(self):
+        """Test generating expiring links with the async view."""
+
+        url = f"{expiring_link_detail_url(self.image.id)}?time=500"
+        request = self.factory.get(url, **self.headers)
+        response = await async_views.link_detail(request, pk=self.image.id)
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data["expires_in"], 500)
+        self.assertIn("RateLimit-Remaining", response)
+
+        url = expiring_link_detail_url(self.image.id)
+        request = self.factory.get(url, **self.headers)
+        response = await async_views.link_detail(request, pk=self.image.id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ManifestAPITests(UserImageTestCase):
+    """Test the image manifest with all variants of every image."""
+
+    def setUp(self):
+        """Create a user with two uploaded images."""
+        caches["default"].clear()
+        self.tier = models.Tier.objects.create(
+            name="Test tier manifest", thumbnails=True, original_size=True
+        )
+        models.ThumbnailSize.objects.create(tier=self.tier, height=8)
+        models.ThumbnailSize.objects.create(tier=self.tier, height=4)
+        self.create_user(self.tier)
+        upload_image(self.user, (20, 10))
+        upload_image(self.user)
+
+    def test_manifest_variants(self):
+        """Test images are listed newest first with thumbnails and original."""
+
+        with self.assertNumQueries(1):
+            response = self.client.get(MANIFEST_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.data["results"][0]
+        image = models.Image.objects.latest("id")
+        self.assertEqual(first["id"], image.id)
+        self.assertEqual(first["blurhash"], image.blurhash)
+        self.assertEqual(first["dominant_color"], image.dominant_color)
+        self.assertEqual(
+            [(v["height"], v["width"], v["original"]) for v in first["variants"]],
+            [(4, 4, False), (8, 8, False), (10, 10, True)],
+        )
+        thumbnail = models.Thumbnail.objects.get(image=image, height__height=4)
+        self.assertTrue(first["variants"][0]["url"].endswith(thumbnail.thumbnail.url))
+        self.assertEqual(first["variants"][0]["bytes"], thumbnail.file_size)
+        self.assertEqual(first["variants"][0]["format"], "JPEG")
+
+    def test_manifest_pagination(self):
+        """Test the manifest is paginated with a cursor."""
+
+        response = self.client.get(MANIFEST_URL, {"page_size": 1})
+        following = self.client.get(response.data["next"])
+
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(len(following.data["results"]), 1)
+        self.assertNotEqual(
+            response.data["results"][0]["id"], following.data["results"][0]["id"]
+        )
+        self.assertIsNone(following.data["next"])
+
+    def test_manifest_respects_tier(self):
+        """Test variants the tier has no access to are left out."""
+
+        self.tier.thumbnails = False
+        self.tier.original_size = False
+        self.tier.save()
+
+        response = self.client.get(MANIFEST_URL)
+
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(response.data["results"][0]["variants"], [])
+
+    def test_manifest_cached_per_user(self):
+        """Test cached responses are keyed by the user and revalidated."""
+
+        other = get_user_model().objects.create_user(
+            username="other", password="test1234", tier=self.tier
+        )
+        token = Token.objects.create(user=self.user)
+        other_token = Token.objects.create(user=other)
+        self.client.force_authenticate(None)
+
+        response = self.client.get(
+            MANIFEST_URL, HTTP_AUTHORIZATION=f"Token {token.key}"
+        )
+        other_response = self.client.get(
+            MANIFEST_URL, HTTP_AUTHORIZATION=f"Token {other_token.key}"
+        )
+        anonymous_response = self.client.get(MANIFEST_URL)
+        not_modified = self.client.get(
+            MANIFEST_URL,
+            HTTP_AUTHORIZATION=f"Token {token.key}",
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+
+        self.assertIn("Authorization", response["Vary"])
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(other_response.json()["results"], [])
+        self.assertEqual(anonymous_response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ResponseFormatTests(UserImageTestCase):
+    """Test sparse fieldsets and MessagePack responses."""
+
+    def setUp(self):
+        """Create a user with an uploaded image."""
+        caches["default"].clear()
+        tier = models.Tier.objects.create(
+            name="Test tier formats", thumbnails=True, original_size=True
+        )
+        models.ThumbnailSize.objects.create(tier=tier, height=8)
+        models.ThumbnailSize.objects.create(tier=tier, height=4)
+        self.create_user(tier)
+        upload_image(self.user, (20, 10))
+
+    def test_sparse_fieldset(self):
+        """Test only the fields listed in the "fields" parameter are returned."""
+
+        response = self.client.get(IMAGE_URL, {"fields": "id,image"})
+        thumbnails = self.client.get(THUMBNAIL_URL, {"fields": "id,height"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data[0]), {"id", "image"})
+        self.assertTrue(response.data[0]["image"].startswith("http://testserver/"))
+        self.assertEqual([set(t) for t in thumbnails.data], [{"id", "height"}] * 2)
+
+    def test_messagepack_response(self):
+        """Test MessagePack is returned when accepted and carries the JSON data."""
+
+        response = self.client.get(IMAGE_URL, HTTP_ACCEPT="application/msgpack")
+        json_response = self.client.get(IMAGE_URL)
+
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertIn("Accept", response["Vary"])
+        self.assertEqual(msgpack.unpackb(response.content), json_response.json())
+
+    def test_list_thumbnails_query_count(self):
+        """Test listing thumbnails takes one query for any number of them."""
+
+        with self.assertNumQueries(1):
+            response = self.client.get(THUMBNAIL_URL)
+
+        self.assertEqual(len(response.data), 2)
+
+
+class LinkBatchAPITests(UserImageTestCase):
+    """Test generating expiring links to many images at once."""
+
+    def setUp(self):
+        """Create a user with two uploaded images."""
+        self.tier = models.Tier.objects.create(
+            name="Test tier links", original_size=True, expiring_link=True
+        )
+        self.create_user(self.tier)
+        self.images = [upload_image(self.user), upload_image(self.user)]
+
+    def test_batch_links(self):
+        """Test links are returned in the order of the ids and redirect."""
+
+        ids = [self.images[1].id, self.images[0].id]
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                LINK_BATCH_URL, {"ids": ids, "time": 500}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["expires_in"], 500)
+        self.assertEqual([link["id"] for link in response.data["links"]], ids)
+        path = urlsplit(response.data["links"][0]["url"])
+        redirect = self.client.get(f"{path.path}?{path.query}")
+        self.assertEqual(redirect.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(redirect["Location"], f"{self.images[1].image.url}?link=1")
+
+    def test_batch_links_of_other_users_images(self):
+        """Test a batch with images of another user is rejected."""
+
+        other = get_user_model().objects.create_user(
+            username="other", password="test1234", tier=self.tier
+        )
+        # Inserted without a file, the upload processing is not needed
+        (other_image,) = models.Image.objects.bulk_create(
+            [models.Image(user=other, image="other.jpg")]
+        )
+
+        response = self.client.post(
+            LINK_BATCH_URL,
+            {"ids": [self.images[0].id, other_image.id], "time": 500},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data["missing"], [other_image.id])
+
+    def test_batch_links_invalid_time(self):
+        """Test a batch with a lifetime out of bounds is rejected."""
+
+        response = self.client.post(
+            LINK_BATCH_URL, {"ids": [self.images[0].id], "time": 10}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_links_without_tier_access(self):
+        """Test tiers without expiring links are refused a batch."""
+
+        self.tier.expiring_link = False
+        self.tier.save()
+
+        response = self.client.post(
+            LINK_BATCH_URL, {"ids": [self.images[0].id], "time": 500}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ThumbnailLinkAPITests(UserImageTestCase):
+    """Test generating expiring links to thumbnails."""
+
+    def setUp(self):
+        """Create a user with an uploaded image and its thumbnail."""
+        caches["default"].clear()
+        self.tier = models.Tier.objects.create(
+            name="Test tier thumbnail links", thumbnails=True, expiring_link=True
+        )
+        models.ThumbnailSize.objects.create(tier=self.tier, height=4)
+        self.create_user(self.tier)
+        self.image = upload_image(self.user)
+        self.thumbnail = models.Thumbnail.objects.get(image=self.image)
+
+    def assertRedirectsToThumbnail(self, link):
+        path = urlsplit(link)
+        response = self.client.get(f"{path.path}?{path.query}")
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response["Location"], f"{self.thumbnail.thumbnail.url}?link=1")
+
+    def test_link_to_thumbnail_height(self):
+        """Test a link to an image with a height leads to its thumbnail."""
+
+        url = expiring_link_detail_url(self.image.id)
+        response = self.client.get(url, {"time": 500, "height": 4})
+        missing = self.client.get(url, {"time": 500, "height": 8})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRedirectsToThumbnail(response.data["url"])
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_link_to_thumbnail_of_invalid_id(self):
+        """Test a link with a height to a non-numeric id is not found."""
+
+        url = reverse("image:link-detail", args=["abc"])
+        response = self.client.get(url, {"time": 500, "height": 4})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_thumbnail_link(self):
+        """Test generating a link from the thumbnail endpoint."""
+
+        url = reverse("image:thumbnail-link", args=[self.thumbnail.id])
+        response = self.client.get(url, {"time": 500})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["expires_in"], 500)
+        self.assertRedirectsToThumbnail(response.data["url"])
+        self.assertIn("RateLimit-Remaining", response)
+
+    def test_batch_thumbnail_links(self):
+        """Test a batch with a height links the thumbnails."""
+
+        response = self.client.post(
+            LINK_BATCH_URL,
+            {"ids": [self.image.id], "time": 500, "height": 4},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRedirectsToThumbnail(response.data["links"][0]["url"])
+
+    async def test_async_thumbnail_link(self):
+        """Test the async view links thumbnails by height."""
+
+        token = await Token.objects.acreate(user=self.user)
+        url = expiring_link_detail_url(self.image.id)
+        request = AsyncRequestFactory().get(
+            url, {"time": 500, "height": 4}, AUTHORIZATION=f"Token {token.key}"
+        )
+        response = await async_views.link_detail(request, pk=self.image.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        link = json.loads(response.content)["url"]
+        self.assertIn(
+            self.thumbnail.thumbnail.url, parse_link(urlsplit(link).path[1:])[0]
+        )
+
+
+class LinkRevocationAPITests(UserImageTestCase):
+    """Test revoking expiring links."""
+
+    def setUp(self):
+        """Create a user with an uploaded image and a link to it."""
+        caches["default"].clear()
+        caches["shared"].clear()
+        self.tier = models.Tier.objects.create(
+            name="Test tier revocation", original_size=True, expiring_link=True
+        )
+        self.create_user(self.tier)
+        self.image = upload_image(self.user)
+        response = self.client.get(
+            expiring_link_detail_url(self.image.id), {"time": 500}
+        )
+        self.link = response.data["url"]
+        path = urlsplit(self.link)
+        self.link_path = f"{path.path}?{path.query}"
+
+    def test_revoked_link_not_found(self):
+        """Test a revoked link stops redirecting."""
+
+        self.assertEqual(
+            self.client.get(self.link_path).status_code, status.HTTP_302_FOUND
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                LINK_REVOKE_URL, {"url": self.link}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.client.get(self.link_path).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_altered_revoked_link_not_found(self):
+        """Test revoked links can not be altered or forged into valid ones."""
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(LINK_REVOKE_URL, {"url": self.link}, format="json")
+        path = urlsplit(self.link).path
+        url, expires, _ = parse_link(path[1:])
+        altered = [
+            f"{path}.?exp=1",
+            f"{path[:5]}.{path[5:]}?exp=1",
+            f"{path}=?exp=1",
+            # Issued again by the holder, who does not know the key
+            "/{}?exp=1".format(
+                signing.dumps(
+                    [url, expires + 100, "0" * 32], key="guess", salt=LINK_SALT
+                )
+            ),
+            "/{}?exp=1".format(
+                base64.urlsafe_b64encode(f"{url}?expires={expires}".encode()).decode()
+            ),
+        ]
+
+        for link_path in altered:
+            with self.subTest(link_path=link_path):
+                response = self.client.get(link_path)
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_revoke_link_of_other_user(self):
+        """Test links to files of other users can not be revoked."""
+
+        other = get_user_model().objects.create_user(
+            username="other", password="test1234", tier=self.tier
+        )
+        self.client.force_authenticate(other)
+
+        response = self.client.post(LINK_REVOKE_URL, {"url": self.link}, format="json")
+        invalid = self.client.post(
+            LINK_REVOKE_URL, {"url": "http://testserver/invalid?exp=1"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(models.RevokedLink.objects.exists())
+
+
+class SimilarImageAPITests(UserImageTestCase):
+    """Test searching near-duplicates of an image."""
+
+    def setUp(self):
+        """Create a user with an image, a resized copy and another image."""
+        caches["default"].clear()
+        caches["shared"].clear()
+        self.tier = models.Tier.objects.create(
+            name="Test tier similar", original_size=True
+        )
+        self.create_user(self.tier)
+        gradient = Image.linear_gradient("L").rotate(45).convert("RGB")
+        self.image = upload_image(self.user, img=gradient)
+        self.copy = upload_image(self.user, img=gradient.resize((100, 100)))
+        self.other = upload_image(
+            self.user, img=Image.radial_gradient("L").convert("RGB")
+        )
+
+    def test_similar_images(self):
+        """Test near-duplicates are listed without the image itself."""
+
+        url = reverse("image:image-similar", args=[self.image.id])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data], [self.copy.id])
+        self.assertLessEqual(response.data[0]["distance"], 10)
+        self.assertEqual(
+            self.client.get(url, {"distance": 64}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test_similar_images_after_upload(self):
+        """Test a search finds images uploaded after the previous one."""
+
+        url = reverse("image:image-similar", args=[self.image.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            copy = upload_image(
+                self.user, img=Image.linear_gradient("L").rotate(45).convert("RGB")
+            )
+
+        response = self.client.get(url, {"distance": 0})
+
+        self.assertIn(copy.id, [item["id"] for item in response.data])
+
+    def test_similar_images_after_delete(self):
+        """Test a deleted image is no longer found by searches."""
+
+        url = reverse("image:image-similar", args=[self.image.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(image_detail_url(self.copy.id))
+
+        found = similarity.similar_images(self.user.id, self.copy.dhash, 0)
+
+        self.assertNotIn(self.copy.id, [id for _, id in found])
+
+    @patch("image.views.MAX_RESULTS", 1)
+    def test_similar_images_skip_deleted(self):
+        """Test images missing from the database do not take up results."""
+
+        matches = [(0, self.image.id), (1, self.other.id + 1), (2, self.copy.id)]
+        with patch("image.views.similar_images", return_value=matches):
+            response = self.client.get(
+                reverse("image:image-similar", args=[self.image.id])
+            )
+
+        self.assertEqual([item["id"] for item in response.data], [self.copy.id])
+
+    def test_similar_images_not_hashed(self):
+        """Test searching from an image without a hash is a conflict."""
+
+        models.Image.objects.filter(id=self.image.id).update(dhash=None)
+
+        url = reverse("image:image-similar", args=[self.image.id])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
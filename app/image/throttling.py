@@ -0,0 +1,66 @@
+"""
+Rate limiting for the image API.
+"""
+
+from django.conf import settings
+
+from rest_framework.throttling import BaseThrottle
+
+from core.ratelimit import TokenBucket, parse_rate
+
+
+def get_user_rate(user, scope):
+    """Return the (requests, period) rate of the user for the scope or None."""
+
+    rate = settings.RATE_LIMITS.get(scope)
+    if user.tier and scope in user.tier.rate_limits:
+        rate = user.tier.rate_limits[scope]
+    if rate is None:
+        return None
+
+    return parse_rate(rate)
+
+
+class TierRateThrottle(BaseThrottle):
+    """Token bucket throttle with limits per tier and per view action.
+
+    Views map their actions to scopes with a `throttle_scopes` dict.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scopes", {}).get(getattr(view, "action", None))
+        user = request.user
+        if not scope or user.is_superuser or user.is_staff:
+            return True
+
+        rate = get_user_rate(user, scope)
+        if rate is None:
+            return True
+
+        self.state = TokenBucket(*rate).consume(f"throttle:{scope}:{user.pk}")
+        request.rate_limit = self.state
+        return self.state.allowed
+
+    def wait(self):
+        return self.state.retry_after
+
+
+def set_rate_limit_headers(response, state):
+    """Add RateLimit-* headers describing the bucket state to the response."""
+
+    response["RateLimit-Limit"] = state.limit
+    response["RateLimit-Remaining"] = state.remaining
+    response["RateLimit-Reset"] = state.reset
+    response["RateLimit-Policy"] = f"{state.limit};w={state.period}"
+
+
+class RateLimitHeadersMixin:
+    """Add RateLimit-* headers to responses of throttled actions."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        state = getattr(request, "rate_limit", None)
+        if state:
+            set_rate_limit_headers(response, state)
+
+        return response
@@ -2,17 +2,28 @@
 URL mappings for the image API.
 """
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
-from .views import ImageViewSet, ThumbnailViewSet, LinkViewSet
+from . import async_views
+from .views import ImageViewSet, ThumbnailViewSet, LinkViewSet, ManifestViewSet
 
 router = routers.DefaultRouter()
 router.register("images", ImageViewSet)
 router.register("thumbnails", ThumbnailViewSet)
 router.register("link", LinkViewSet, basename="link")
+router.register("manifest", ManifestViewSet, basename="manifest")
 
 app_name = "image"
 
 urlpatterns = [
     path("", include(router.urls)),
 ]
+
+# Hot paths served by async views when running under ASGI
+if settings.SERVER_MODE == "asgi":
+    urlpatterns = [
+        path("images/", async_views.image_list, name="image-list"),
+        path("images/<int:pk>/", async_views.image_detail, name="image-detail"),
+        path("link/<int:pk>/", async_views.link_detail, name="link-detail"),
+    ] + urlpatterns
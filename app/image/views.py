@@ -3,7 +3,7 @@ Views for the image API.
 """
 
 import time
-import base64
+from urllib.parse import urlsplit
 
 from drf_spectacular.utils import (
     extend_schema_view,
@@ -12,17 +12,59 @@ from drf_spectacular.utils import (
 )
 from drf_spectacular.types import OpenApiTypes
 
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import JSONObject
+
 from rest_framework import status
 from rest_framework import viewsets, mixins
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.pagination import CursorPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.response import Response
 
-from core.models import Image, Thumbnail
-from .serializers import ImageSerializer, ThumbnailSerializer, LinkSerializer
+from core.links import (
+    LINK_TIME_MAX,
+    LINK_TIME_MIN,
+    build_expiring_link,
+    build_expiring_links,
+    parse_link,
+    stored_file_name,
+)
+from core.metrics import ViewMetricsMixin
+from core.timing import ViewTimingMixin, timed
+from core.models import Image, Thumbnail, StorageUsage
+from core.revocation import revoke_link
+from core.serializers import file_url_builder
+from core.similarity import (
+    DEFAULT_DISTANCE,
+    MAX_DISTANCE,
+    MAX_RESULTS,
+    similar_images,
+)
+from .serializers import (
+    ImageListSerializer,
+    ImageSerializer,
+    ThumbnailSerializer,
+    ExpiringLinkSerializer,
+    LinkSerializer,
+    LinkBatchSerializer,
+    LinkBatchResultSerializer,
+    RevokeLinkSerializer,
+    SimilarImageSerializer,
+    ManifestSerializer,
+)
+from .caching import PrivateCacheMixin
+from .replicas import ReplicaReadMixin
+from .throttling import RateLimitHeadersMixin, TierRateThrottle
 
 
+@timed("perm")
 def check_user_acces_to_original_image(request):
     """Function that checks user permissions to access full-size images."""
     if (
@@ -34,6 +76,7 @@ def check_user_acces_to_original_image(request):
     return False
 
 
+@timed("perm")
 def check_user_acces_to_thumbnails(request):
     """A function that checks user permissions to generate thumbnails."""
     if (
@@ -45,6 +88,7 @@ def check_user_acces_to_thumbnails(request):
     return False
 
 
+@timed("perm")
 def check_user_acces_to_expiring_link(request):
     """A function that checks user permissions to generate expiring links."""
     if (
@@ -56,7 +100,80 @@ def check_user_acces_to_expiring_link(request):
     return False
 
 
+@timed("perm")
+def check_user_storage_quota(request, size):
+    """A function that checks the user has storage left for a new upload."""
+    tier = request.user.tier
+    if request.user.is_superuser or request.user.is_staff or not tier:
+        return True
+    if tier.max_images is None and tier.max_storage_bytes is None:
+        return True
+
+    # Locking the counters until the upload is saved and counted
+    usage = (
+        StorageUsage.objects.select_for_update()
+        .filter(user=request.user)
+        .values_list("image_count", "bytes_used")
+        .first()
+    ) or (0, 0)
+    image_count, bytes_used = usage
+    if tier.max_images is not None and image_count >= tier.max_images:
+        return False
+    if (
+        tier.max_storage_bytes is not None
+        and bytes_used + size > tier.max_storage_bytes
+    ):
+        return False
+    return True
+
+
+def hide_original_path(data):
+    """Leave only the file name of the original image in serialized data."""
+    if "image" in data:
+        data["image"] = data["image"].split("/")[-1]
+
+
+def parse_link_height(height):
+    """A function that returns the requested thumbnail height or None if invalid."""
+    try:
+        height_int = int(height)
+    except (TypeError, ValueError):
+        return None
+    if height_int < 1:
+        return None
+    return height_int
+
+
+def parse_similar_distance(distance):
+    """A function that returns the requested hash distance or None if invalid."""
+    if distance is None:
+        return DEFAULT_DISTANCE
+    try:
+        distance_int = int(distance)
+    except ValueError:
+        return None
+    if distance_int < 0 or distance_int > MAX_DISTANCE:
+        return None
+    return distance_int
+
+
+def parse_link_time(request_time):
+    """A function that returns the requested link lifetime or None if invalid."""
+    try:
+        request_time_int = int(request_time)
+    except (TypeError, ValueError):
+        return None
+    if request_time_int < LINK_TIME_MIN or request_time_int > LINK_TIME_MAX:
+        return None
+    return request_time_int
+
+
 class ImageViewSet(
+    ViewMetricsMixin,
+    ViewTimingMixin,
+    PrivateCacheMixin,
+    ReplicaReadMixin,
+    RateLimitHeadersMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
@@ -70,33 +187,92 @@ class ImageViewSet(
     parser_classes = [MultiPartParser, FormParser]
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TierRateThrottle]
+    throttle_scopes = {"create": "upload"}
+    replica_actions = ("list", "retrieve", "similar")
 
     def get_queryset(self):
         return Image.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            size = serializer.validated_data["image"].size
+            if not check_user_storage_quota(self.request, size):
+                raise PermissionDenied("Storage quota exceeded.")
+            serializer.save(user=self.request.user)
 
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
-
-        if not check_user_acces_to_original_image(request):
-            for path in response.data:
-                path["image"] = path["image"].split("/")[-1]
-
-            return response
+        serializer = ImageListSerializer(
+            request, show_original=check_user_acces_to_original_image(request)
+        )
+        rows = list(serializer.rows(self.filter_queryset(self.get_queryset())))
 
-        return response
+        return Response(serializer.to_representation(rows))
 
     def retrieve(self, request, *args, **kwargs):
         response = super().retrieve(request, *args, **kwargs)
 
         if not check_user_acces_to_original_image(request):
-            response.data["image"] = response.data["image"].split("/")[-1]
+            hide_original_path(response.data)
             return response
 
         return response
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "distance",
+                OpenApiTypes.INT,
+                description=(
+                    f"Most differing bits of the perceptual hashes, "
+                    f"{DEFAULT_DISTANCE} by default and {MAX_DISTANCE} at most."
+                ),
+            ),
+        ],
+        responses={200: SimilarImageSerializer(many=True)},
+    )
+    @action(detail=True, serializer_class=SimilarImageSerializer)
+    def similar(self, request, *args, **kwargs):
+        """A method listing near-duplicates of the image, closest first."""
+
+        image = self.get_object()
+        distance = parse_similar_distance(request.query_params.get("distance"))
+        if distance is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if image.dhash is None:
+            return Response(
+                {"detail": "The image is not hashed yet."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        matches = [
+            (match_distance, id)
+            for match_distance, id in similar_images(
+                request.user.id, image.dhash, distance
+            )
+            if id != image.id
+        ]
+        similar = []
+        # Fetched a page at a time until MAX_RESULTS images are found, images
+        # deleted before the index learnt of it are left out
+        for start in range(0, len(matches), MAX_RESULTS):
+            end = start + MAX_RESULTS
+            page = matches[start:end]
+            images = self.get_queryset().in_bulk([id for _, id in page])
+            for match_distance, id in page:
+                if id in images:
+                    images[id].distance = match_distance
+                    similar.append(images[id])
+            if len(similar) >= MAX_RESULTS:
+                break
+        similar = similar[:MAX_RESULTS]
+
+        data = self.get_serializer(similar, many=True).data
+        if not check_user_acces_to_original_image(request):
+            for item in data:
+                hide_original_path(item)
+        return Response(data)
+
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
 
@@ -109,6 +285,11 @@ class ImageViewSet(
 
 
 class ThumbnailViewSet(
+    ViewMetricsMixin,
+    ViewTimingMixin,
+    PrivateCacheMixin,
+    ReplicaReadMixin,
+    RateLimitHeadersMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     mixins.DestroyModelMixin,
@@ -120,9 +301,14 @@ class ThumbnailViewSet(
     queryset = Thumbnail.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TierRateThrottle]
+    throttle_scopes = {"link": "link"}
+    replica_actions = ("list", "retrieve", "link")
 
     def get_queryset(self):
-        return Thumbnail.objects.filter(user=self.request.user)
+        return Thumbnail.objects.filter(user=self.request.user).select_related(
+            "height"
+        )
 
     def retrieve(self, request, *args, **kwargs):
         response = super().retrieve(request, *args, **kwargs)
@@ -145,6 +331,42 @@ class ThumbnailViewSet(
 
         return Response(status=status.HTTP_403_FORBIDDEN)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "time",
+                OpenApiTypes.INT,
+                description="Link expiring time.",
+                required=True,
+            ),
+        ],
+        responses={200: ExpiringLinkSerializer},
+    )
+    @action(detail=True)
+    def link(self, request, *args, **kwargs):
+        """A method generating an expiring link to the thumbnail."""
+
+        if not (
+            check_user_acces_to_thumbnails(request)
+            and check_user_acces_to_expiring_link(request)
+        ):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        thumbnail = self.get_object()
+        request_time = parse_link_time(request.query_params.get("time"))
+        if request_time is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "url": build_expiring_link(
+                    request, thumbnail.thumbnail.url, request_time
+                ),
+                "expires_in": request_time,
+            },
+            status=status.HTTP_200_OK,
+        )
+
 
 @extend_schema_view(
     retrieve=extend_schema(
@@ -155,10 +377,20 @@ class ThumbnailViewSet(
                 description="Link expiring time.",
                 required=True,
             ),
+            OpenApiParameter(
+                "height",
+                OpenApiTypes.INT,
+                description="Height of the thumbnail to link instead of the image.",
+            ),
         ]
     )
 )
 class LinkViewSet(
+    ViewMetricsMixin,
+    ViewTimingMixin,
+    PrivateCacheMixin,
+    ReplicaReadMixin,
+    RateLimitHeadersMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
@@ -168,6 +400,8 @@ class LinkViewSet(
     queryset = Image.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TierRateThrottle]
+    throttle_scopes = {"retrieve": "link", "batch": "link_batch", "revoke": "link"}
 
     def get_queryset(self):
         return Image.objects.filter(user=self.request.user)
@@ -178,40 +412,175 @@ class LinkViewSet(
         if not check_user_acces_to_expiring_link(request):
             return Response(status=status.HTTP_403_FORBIDDEN)
 
-        if not self.get_object():
-            return Response(status=status.HTTP_404_NOT_FOUND)
-
-        if not self.request.query_params.get("time"):
+        if "height" in request.query_params:
+            # A link to the thumbnail of the image with that height
+            if not check_user_acces_to_thumbnails(request):
+                return Response(status=status.HTTP_403_FORBIDDEN)
+            height = parse_link_height(request.query_params["height"])
+            if height is None:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            # Given the lookups, a non-numeric id is a 404 rather than a 500
+            url = get_object_or_404(
+                Thumbnail.objects.only("thumbnail"),
+                user=request.user,
+                image_id=kwargs["pk"],
+                height__height=height,
+            ).thumbnail.url
+        else:
+            url = self.get_object().image.url
+        request_time_int = parse_link_time(self.request.query_params.get("time"))
+        if request_time_int is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        image = self.get_object()
-        request_time = self.request.query_params.get("time")
-        try:
-            request_time_int = int(request_time)
-            if request_time_int < 300 or request_time_int > 30000:
-                raise ValueError
-        except ValueError:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+        encrypted_url_with_exp = build_expiring_link(request, url, request_time_int)
 
-        exp_time = int(time.time()) + request_time_int
-        url_with_exp = f"{image.image.url}?expires={exp_time}"
-        # URL encoding to hide the original path and expiration time
-        # Decoding takes place in the custom middleware
-        encrypted_path = base64.urlsafe_b64encode(url_with_exp.encode("utf-8")).decode(
-            "utf-8"
+        return Response(
+            {
+                "url": encrypted_url_with_exp,
+                "expires_in": request_time_int,
+            },
+            status=status.HTTP_200_OK,
         )
-        try:
-            encrypted_url_with_exp = (
-                f"http://{request.META['HTTP_HOST']}/{encrypted_path}?exp=1"
+
+    @extend_schema(
+        request=LinkBatchSerializer, responses={200: LinkBatchResultSerializer}
+    )
+    @action(detail=False, methods=["post"], serializer_class=LinkBatchSerializer)
+    def batch(self, request):
+        """A method generating expiring links to many images at once."""
+
+        if not check_user_acces_to_expiring_link(request):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+        request_time = serializer.validated_data["time"]
+        height = serializer.validated_data.get("height")
+
+        # One query checks the ownership of all images
+        if height is None:
+            field = Image._meta.get_field("image")
+            names = dict(
+                self.get_queryset().filter(id__in=ids).values_list("id", "image")
+            )
+        else:
+            if not check_user_acces_to_thumbnails(request):
+                return Response(status=status.HTTP_403_FORBIDDEN)
+            field = Thumbnail._meta.get_field("thumbnail")
+            names = dict(
+                Thumbnail.objects.filter(
+                    user=request.user, image_id__in=ids, height__height=height
+                ).values_list("image_id", "thumbnail")
             )
-        # Code snippet for testing purposes only
-        except KeyError:
-            encrypted_url_with_exp = f"http://example.com/{encrypted_path}?exp=1"
+        missing = [id for id in ids if id not in names]
+        if missing:
+            return Response(
+                {"detail": "Not found.", "missing": missing},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        file_url = file_url_builder(field.storage)
+        links = build_expiring_links(
+            request, [file_url(names[id]) for id in ids], request_time
+        )
 
         return Response(
             {
-                "url": encrypted_url_with_exp,
-                "expires_in": request_time_int,
+                "links": [{"id": id, "url": url} for id, url in zip(ids, links)],
+                "expires_in": request_time,
             },
             status=status.HTTP_200_OK,
         )
+
+    @extend_schema(request=RevokeLinkSerializer, responses={204: None})
+    @action(detail=False, methods=["post"], serializer_class=RevokeLinkSerializer)
+    def revoke(self, request):
+        """A method revoking an expiring link to a file of the user."""
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        path = urlsplit(serializer.validated_data["url"]).path[1:]
+        link = parse_link(path)
+        if link is None or link[1] < time.time():
+            return Response(
+                {"detail": "Invalid or expired link."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        name = stored_file_name(link[0])
+        if not (
+            Image.objects.filter(user=request.user, image=name).exists()
+            or Thumbnail.objects.filter(user=request.user, thumbnail=name).exists()
+        ):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        revoke_link(request.user, link[2], link[1])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ManifestPagination(CursorPagination):
+    """Pages of images newest first, without counting all of them."""
+
+    ordering = "-id"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class ManifestViewSet(
+    ViewMetricsMixin,
+    ViewTimingMixin,
+    PrivateCacheMixin,
+    ReplicaReadMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """View listing images with all variants the user may access."""
+
+    serializer_class = ManifestSerializer
+    queryset = Image.objects.all()
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = ManifestPagination
+
+    def get_queryset(self):
+        queryset = Image.objects.filter(user=self.request.user).only(
+            "id",
+            "image",
+            "width",
+            "height",
+            "file_size",
+            "format",
+            "blurhash",
+            "dominant_color",
+        )
+        if not check_user_acces_to_thumbnails(self.request):
+            return queryset
+
+        # Thumbnails are aggregated into the image rows, one query per page
+        thumbnails = (
+            Thumbnail.objects.filter(image=OuterRef("pk"))
+            .order_by()
+            .values("image")
+            .annotate(
+                variants=JSONBAgg(
+                    JSONObject(
+                        height="height__height",
+                        width="width",
+                        file="thumbnail",
+                        bytes="file_size",
+                        format="format",
+                    ),
+                    ordering="height__height",
+                )
+            )
+            .values("variants")
+        )
+        return queryset.annotate(thumbnail_variants=Subquery(thumbnails))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["thumbnails"] = check_user_acces_to_thumbnails(self.request)
+        context["original"] = check_user_acces_to_original_image(self.request)
+        return context
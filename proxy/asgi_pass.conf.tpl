@@ -0,0 +1,9 @@
+proxy_pass              http://${APP_HOST}:${APP_PORT};
+include                 /etc/nginx/proxy_params;
+
+# Uploads are read completely before they take up a worker
+proxy_request_buffering on;
+proxy_buffering         ${UPSTREAM_BUFFERING};
+proxy_buffer_size       ${UPSTREAM_BUFFER_SIZE};
+proxy_buffers           ${UPSTREAM_BUFFERS};
+proxy_read_timeout      ${UPSTREAM_READ_TIMEOUT};
@@ -1,13 +1,70 @@
+# Expiring links redirect to files with "?link=1", which caches must not
+# keep past the link
+map $arg_link $thumbnail_cache_control {
+    default                 "public, max-age=${MEDIA_MAX_AGE}, immutable";
+    1                       "private, max-age=${ORIGINAL_MAX_AGE}";
+}
+
 server {
     listen ${LISTEN_PORT};
 
+    sendfile                on;
+    sendfile_max_chunk      ${SENDFILE_MAX_CHUNK};
+    tcp_nopush              on;
+    tcp_nodelay             on;
+
+    # API responses are JSON, admin and docs assets are text
+    gzip                    ${GZIP};
+    gzip_comp_level         ${GZIP_COMP_LEVEL};
+    gzip_min_length         ${GZIP_MIN_LENGTH};
+    gzip_proxied            any;
+    gzip_vary               on;
+    gzip_types              application/json application/vnd.oai.openapi
+                            application/javascript text/css text/plain
+                            image/svg+xml;
+
+    location /static/static {
+        alias                   /vol/static/static;
+        expires                 ${STATIC_EXPIRES};
+    }
+
+    # Thumbnails get unique names and are never rewritten, unless linked
+    location ~ ^/static/media/(.+_thumbnail\.\w+)$ {
+        alias                   /vol/static/media/$1;
+        add_header              Cache-Control $thumbnail_cache_control;
+        open_file_cache         max=${OPEN_FILE_CACHE_MAX} inactive=${OPEN_FILE_CACHE_INACTIVE};
+        open_file_cache_valid   ${OPEN_FILE_CACHE_VALID};
+        open_file_cache_min_uses 2;
+        open_file_cache_errors  off;
+    }
+
+    # Originals are the targets of expiring links, which caches must not outlive
+    location /static/media {
+        alias                   /vol/static/media;
+        add_header              Cache-Control "private, max-age=${ORIGINAL_MAX_AGE}";
+        open_file_cache         max=${OPEN_FILE_CACHE_MAX} inactive=${OPEN_FILE_CACHE_INACTIVE};
+        open_file_cache_valid   ${OPEN_FILE_CACHE_VALID};
+        open_file_cache_min_uses 2;
+        open_file_cache_errors  off;
+    }
+
     location /static {
         alias /vol/static;
     }
 
+    # Scraped from inside the private network only
+    location = /metrics {
+        include                 /etc/nginx/app_pass.conf;
+        allow                   10.0.0.0/8;
+        allow                   172.16.0.0/12;
+        allow                   192.168.0.0/16;
+        allow                   127.0.0.1;
+        deny                    all;
+    }
+
     location / {
-        uwsgi_pass              ${APP_HOST}:${APP_PORT};
-        include                 /etc/nginx/uwsgi_params;
-        client_max_body_size    10M;
+        include                 /etc/nginx/app_pass.conf;
+        client_max_body_size    ${CLIENT_MAX_BODY_SIZE};
+        client_body_buffer_size ${CLIENT_BODY_BUFFER_SIZE};
     }
-}
\ No newline at end of file
+}
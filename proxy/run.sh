@@ -2,5 +2,8 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+# Only variables of the environment are replaced, nginx ones like $arg_link stay
+VARIABLES="$(printf '${%s} ' $(env | cut -d= -f1))"
+envsubst "$VARIABLES" < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+envsubst "$VARIABLES" < /etc/nginx/${SERVER_MODE}_pass.conf.tpl > /etc/nginx/app_pass.conf
 nginx -g 'daemon off;'
\ No newline at end of file
@@ -0,0 +1,9 @@
+uwsgi_pass              ${APP_HOST}:${APP_PORT};
+include                 /etc/nginx/uwsgi_params;
+
+# Uploads are read completely before they take up a worker
+uwsgi_request_buffering on;
+uwsgi_buffering         ${UPSTREAM_BUFFERING};
+uwsgi_buffer_size       ${UPSTREAM_BUFFER_SIZE};
+uwsgi_buffers           ${UPSTREAM_BUFFERS};
+uwsgi_read_timeout      ${UPSTREAM_READ_TIMEOUT};
@@ -2,9 +2,25 @@
 
 set -e
 
-python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
-python manage.py model_base_setup
+# Workers write metrics to files in this directory, stale ones are removed
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
+# Setup steps whose state is already current are skipped
+python manage.py startup
+
+# Workers are forked from a master with the app preloaded unless
+# APP_PRELOAD=0, then every worker loads the app on its own
+if [ "$SERVER_MODE" = "asgi" ]; then
+    PRELOAD=""
+    [ "${APP_PRELOAD:-1}" = "1" ] && PRELOAD="--preload"
+    gunicorn app.asgi:application --bind :9000 --workers 4 \
+        --worker-class uvicorn.workers.UvicornWorker $PRELOAD
+else
+    LAZY_APPS=""
+    [ "${APP_PRELOAD:-1}" = "1" ] || LAZY_APPS="--lazy-apps"
+    uwsgi --socket :9000 --workers 4 --master --enable-threads --need-app \
+        --die-on-term --module app.wsgi $LAZY_APPS
+fi